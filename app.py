@@ -1,52 +1,474 @@
 import os
+import re
 import json
+import base64
+import difflib
 import logging
-from sqlalchemy import Column, String, Integer, text
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import wraps
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from sqlalchemy import bindparam, text
 from flask_sqlalchemy import SQLAlchemy
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, g, render_template, request, jsonify, stream_with_context, template_rendered
 from sqlalchemy.exc import OperationalError
+from exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_chunks, export_filename
+from request_timing import RequestTimer
+from response_cache import GenerationStamp, ResponseCache
+
+# FLASK_DEBUG=1 turns on debug logging and SQL echo; production runs quiet
+DEBUG = os.environ.get('FLASK_DEBUG') == '1'
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=logging.DEBUG if DEBUG else logging.INFO)
 app = Flask(__name__)
 application = app
-app.logger.setLevel(logging.DEBUG)
+app.logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
 
 # Configure database
 db_path = os.path.abspath('volusia_inmates.db')
+
+def connect_readonly():
+    """Read-only connection for the web app; the scraper and snapshots.py are the only writers"""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+    conn.execute('PRAGMA query_only = 1')
+    conn.execute(f"PRAGMA mmap_size = {int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}")
+    conn.execute('PRAGMA cache_size = -8000')
+    return conn
+
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+# Pooled connections are opened on first use, not at import, so a cold worker starts without touching the database
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'creator': connect_readonly,
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = True
+app.config['SQLALCHEMY_ECHO'] = DEBUG
+
+# Rendered responses are reused until the scraper writes a new data generation.
+# Set RESPONSE_CACHE_DIR to share the cache between worker processes.
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+app.config['RESPONSE_CACHE_DIR'] = os.environ.get('RESPONSE_CACHE_DIR')
 
 db = SQLAlchemy()
 db.init_app(app)
 
-# Test database connection
-try:
-    with app.app_context():
-        db.session.execute(text("SELECT 1")).scalar()
-        app.logger.info("Database connection successful")
-except Exception as e:
-    app.logger.error(f"Failed to connect to database: {e}")
-
-class Inmate(db.Model):
-    __tablename__ = 'inmates'
-    id = Column(Integer, primary_key=True)
-    booking_num = Column(String, unique=True)
-    inmate_id = Column(String)
-    last_name = Column(String)
-    first_name = Column(String)
-    middle_name = Column(String)
-    suffix = Column(String)
-    sex = Column(String)
-    race = Column(String)
-    booking_date = Column(String)
-    release_date = Column(String)
-    in_custody = Column(String)
-    photo_link = Column(String)
-    charges = Column(String)
+generation_stamp = GenerationStamp(f'{db_path}.generation')
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_DIR'])
+request_timer = RequestTimer(app)
+
+INMATE_FIELDS = ['id', 'booking_num', 'inmate_id', 'last_name', 'first_name', 'middle_name', 'suffix',
+                 'sex', 'race', 'booking_date', 'release_date', 'booking_at', 'released_at', 'in_custody',
+                 'photo_link', 'charge_count']
+
+# Query-string filters understood by the listing and the API
+FILTER_FIELDS = ['search_name', 'search_race', 'search_gender', 'booked_from', 'booked_to',
+                 'released_from', 'released_to', 'custody', 'charge', 'crime_class', 'agency']
+
+# Charge facets: filter field -> facet name in the inmate_facets index
+FACET_FILTERS = {'crime_class': 'crime_class', 'agency': 'arresting_agency'}
+FACET_LIMIT = 50
+
+CHARGE_FIELDS = ['seq_number', 'charge_description', 'counts', 'offense_date', 'docket_number',
+                 'sentence_date', 'disposition', 'disposition_date', 'sentence_length', 'crime_class',
+                 'arresting_agencies', 'attempt_commit', 'charge_bond']
+
+CHARGES_QUERY = text(f'''
+    SELECT c.inmate_row_id, b.booking_num, {', '.join('c.' + field for field in CHARGE_FIELDS)}
+    FROM charges c
+    LEFT JOIN bookings b ON b.id = c.booking_id
+    WHERE c.inmate_row_id IN :ids
+    ORDER BY c.inmate_row_id, b.position, c.position
+''').bindparams(bindparam('ids', expanding=True))
+
+def row_dicts(result):
+    """Rows of a result as plain dicts of the columns the query selected"""
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+def load_charges(inmate_ids):
+    """Charges for the given inmates rows, grouped by row id in booking/charge order"""
+    charges = {inmate_id: [] for inmate_id in inmate_ids}
+    if not inmate_ids:
+        return charges
+
+    for charge in row_dicts(db.session.execute(CHARGES_QUERY, {'ids': list(inmate_ids)})):
+        charges[charge.pop('inmate_row_id')].append(charge)
+    return charges
+
+def similar_name_terms(word, limit=5):
+    """Indexed name tokens that look like a misspelling of word (same first letter)"""
+    candidates = db.session.execute(
+        text("SELECT term FROM inmate_name_terms WHERE term >= :low AND term < :high"),
+        {'low': word[0], 'high': chr(ord(word[0]) + 1)}
+    ).scalars().all()
+    return difflib.get_close_matches(word, candidates, n=limit, cutoff=0.75)
+
+def name_match_query(search_name, fuzzy=False):
+    """FTS5 expression requiring every search word to prefix-match a name part"""
+    clauses = []
+    for word in re.findall(r'\w+', search_name.lower()):
+        options = [f'"{word}"*']
+        if fuzzy:
+            options += [f'"{term}"' for term in similar_name_terms(word) if term != word]
+        clauses.append('(' + ' OR '.join(options) + ')')
+    return ' AND '.join(clauses)
+
+def charge_match_query(keywords):
+    """FTS5 expression requiring every keyword to prefix-match the charge description"""
+    return ' AND '.join(f'"{word}"*' for word in re.findall(r'\w+', keywords.lower()))
+
+def parse_day(value, days=0):
+    """ISO date string for a YYYY-MM-DD filter value shifted by days, or None if invalid"""
+    try:
+        return (datetime.strptime(value, '%Y-%m-%d') + timedelta(days=days)).date().isoformat()
+    except ValueError:
+        return None
+
+def filter_clause(filters, fuzzy=False):
+    """WHERE clause and parameters for the listing filters"""
+    where = " WHERE 1=1"
+    params = {}
+
+    name_query = name_match_query(filters['search_name'], fuzzy) if filters['search_name'] else ''
+    if name_query:
+        where += " AND id IN (SELECT rowid FROM inmate_names WHERE inmate_names MATCH :name_query)"
+        params['name_query'] = name_query
+
+    if filters['search_race']:
+        where += " AND race = :search_race COLLATE NOCASE"
+        params['search_race'] = filters['search_race']
+
+    if filters['search_gender']:
+        where += " AND sex = :search_gender COLLATE NOCASE"
+        params['search_gender'] = filters['search_gender']
+
+    if filters['custody'] == 'in':
+        where += " AND in_custody = 'Yes'"
+    elif filters['custody'] == 'released':
+        where += " AND in_custody = 'No'"
+
+    # Date ranges are inclusive days, compared as half-open ISO ranges so they use the indexes
+    for column, prefix in (('booking_at', 'booked'), ('released_at', 'released')):
+        start = parse_day(filters[f'{prefix}_from']) if filters[f'{prefix}_from'] else None
+        end = parse_day(filters[f'{prefix}_to'], days=1) if filters[f'{prefix}_to'] else None
+        if start:
+            where += f" AND {column} >= :{prefix}_start"
+            params[f'{prefix}_start'] = start
+        if end:
+            where += f" AND {column} < :{prefix}_end AND {column} != ''"
+            params[f'{prefix}_end'] = end
+
+    # Charge filters look at the charges on each row's own booking, like the facet counts
+    charge_query = charge_match_query(filters['charge']) if filters['charge'] else ''
+    if charge_query:
+        where += """ AND id IN (
+            SELECT c.inmate_row_id FROM charge_text
+            JOIN charges c ON c.id = charge_text.rowid
+            JOIN bookings b ON b.id = c.booking_id AND b.position = 0
+            WHERE charge_text MATCH :charge_query)"""
+        params['charge_query'] = charge_query
+
+    for field, facet in FACET_FILTERS.items():
+        if filters[field]:
+            where += f""" AND id IN (
+                SELECT inmate_row_id FROM inmate_facets WHERE facet = '{facet}' AND value = :{field})"""
+            params[field] = filters[field]
+
+    return where, params
+
+COUNT_CACHE_SIZE = 256
+count_cache = OrderedDict()
+# Threaded workers share the cache; the lock keeps a lookup and its move_to_end together
+count_cache_lock = threading.Lock()
+
+def data_generation():
+    """Generation stamp the scraper bumps whenever it writes new data"""
+    generation, _ = generation_stamp.read()
+    if generation is not None:
+        return generation
+    try:
+        return db.session.execute(text("SELECT value FROM scrape_meta WHERE key = 'generation'")).scalar()
+    except OperationalError:
+        db.session.rollback()
+        return None
+
+def count_cache_get(key):
+    """Cached count or facet list for key, or None"""
+    with count_cache_lock:
+        value = count_cache.get(key)
+        if value is not None:
+            count_cache.move_to_end(key)
+        return value
+
+def count_cache_put(key, value):
+    with count_cache_lock:
+        count_cache[key] = value
+        count_cache.move_to_end(key)
+        if len(count_cache) > COUNT_CACHE_SIZE:
+            count_cache.popitem(last=False)
+
+def cached_count(where, params):
+    """COUNT(*) for a filter combination, reused until the scraper writes new data"""
+    generation = data_generation()
+    key = (generation, where, tuple(sorted(params.items())))
+    if generation is not None:
+        count = count_cache_get(key)
+        if count is not None:
+            return count
+
+    count = db.session.execute(text("SELECT COUNT(*) FROM inmates" + where), params).scalar()
+    if generation is not None:
+        count_cache_put(key, count)
+    return count
+
+def cached_facets(filters, fuzzy=False):
+    """Matching inmates per crime class and arresting agency, read from the facet index
+
+    Each facet is counted under every active filter except its own, so the other
+    options of a selected facet keep their counts.
+    """
+    generation = data_generation()
+    facets = {}
+    for field, facet in FACET_FILTERS.items():
+        where, params = filter_clause({**filters, field: ''}, fuzzy)
+        key = (generation, 'facet', facet, where, tuple(sorted(params.items())))
+        cached = count_cache_get(key) if generation is not None else None
+        if cached is not None:
+            facets[field] = cached
+            continue
+
+        # Without other filters the posting lists alone answer the count
+        source = "inmate_facets"
+        if where != " WHERE 1=1":
+            source += " JOIN inmates ON inmates.id = inmate_facets.inmate_row_id"
+        rows = db.session.execute(text(f'''
+            SELECT value, COUNT(*) AS inmates FROM {source}{where} AND facet = :facet AND value != ''
+            GROUP BY value ORDER BY inmates DESC, value LIMIT :limit
+        '''), {**params, 'facet': facet, 'limit': FACET_LIMIT})
+        facets[field] = [{'value': value, 'count': count} for value, count in rows]
+        if generation is not None:
+            count_cache_put(key, facets[field])
+    return facets
+
+def encode_cursor(inmate):
+    """Opaque keyset cursor for a row's (booking_at, id) position"""
+    payload = json.dumps([inmate['booking_at'] or '', inmate['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; None for missing or malformed cursors"""
+    if not token:
+        return None
+    try:
+        booking_at, inmate_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return str(booking_at), int(inmate_id)
+    except (ValueError, TypeError):
+        return None
+
+def fetch_page(where, params, after=None, before=None, per_page=50, offset=0):
+    """One page of inmates ordered by (booking_at, id) descending, using keyset seeks
+
+    Returns (rows, prev_cursor, next_cursor). offset is only honoured without a
+    cursor, for old ?page=N links.
+    """
+    params = dict(params)
+    order = "DESC"
+    if before:
+        where += " AND (booking_at, id) > (:cursor_date, :cursor_id)"
+        params['cursor_date'], params['cursor_id'] = before
+        order = "ASC"
+    elif after:
+        where += " AND (booking_at, id) < (:cursor_date, :cursor_id)"
+        params['cursor_date'], params['cursor_id'] = after
+
+    query = f"SELECT {', '.join(INMATE_FIELDS)} FROM inmates{where} ORDER BY booking_at {order}, id {order} LIMIT :limit"
+    params['limit'] = per_page + 1
+    if offset and not (after or before):
+        query += " OFFSET :offset"
+        params['offset'] = offset
+
+    rows = row_dicts(db.session.execute(text(query), params))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = bool(after or offset), has_more
+
+    prev_cursor = encode_cursor(rows[0]) if rows and has_prev else None
+    next_cursor = encode_cursor(rows[-1]) if rows and has_next else None
+    return rows, prev_cursor, next_cursor
+
+# inmate_stats dimensions shown as breakdowns, with their display names
+STATS_DIMENSIONS = {
+    'race': 'Race',
+    'sex': 'Sex',
+    'custody': 'Custody Status',
+    'crime_class': 'Crime Class',
+    'arresting_agency': 'Arresting Agency',
+}
+
+def load_stats(days=30):
+    """Dashboard counts, read only from the inmate_stats table the scraper maintains"""
+    stats = {'total': 0, 'days': days, 'bookings_per_day': []}
+    stats.update({dimension: [] for dimension in STATS_DIMENSIONS})
+
+    rows = db.session.execute(text('''
+        SELECT dimension, value, count FROM inmate_stats
+        WHERE dimension != 'booking_day' AND count > 0
+        ORDER BY dimension, count DESC, value
+    '''))
+    for dimension, value, count in rows:
+        if dimension == 'total':
+            stats['total'] = count
+        elif dimension in STATS_DIMENSIONS:
+            stats[dimension].append({'value': value, 'count': count})
+
+    since = (datetime.now() - timedelta(days=days - 1)).date().isoformat()
+    rows = db.session.execute(text('''
+        SELECT value, count FROM inmate_stats
+        WHERE dimension = 'booking_day' AND value >= :since AND count > 0
+        ORDER BY value
+    '''), {'since': since})
+    stats['bookings_per_day'] = [{'day': day, 'count': count} for day, count in rows]
+    return stats
+
+def stats_days(args):
+    return min(max(1, int(args.get('days', 30))), 3650)
+
+def search_filters(args):
+    """Listing filters from the query string, with a fuzzy retry when a name matches nothing
+
+    Returns (filters, where, params, total, fuzzy).
+    """
+    filters = {field: args.get(field, '').strip() for field in FILTER_FIELDS}
+
+    where, params = filter_clause(filters)
+    total = cached_count(where, params)
+
+    # Nothing matched the name as typed: retry allowing close spellings
+    fuzzy = False
+    if not total and filters['search_name']:
+        fuzzy = True
+        where, params = filter_clause(filters, fuzzy=True)
+        total = cached_count(where, params)
+
+    return filters, where, params, total, fuzzy
+
+@template_rendered.connect_via(app)
+def mark_error_pages(sender, template, context, **extra):
+    # Error pages are rendered with status 200; keep them out of the response cache
+    if template.name == 'error.html':
+        g.uncacheable = True
+
+def cached_response(view):
+    """Serve a view from the response cache, answering conditional requests with 304"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        generation, updated_at = generation_stamp.read()
+        if generation is None:
+            return view(*args, **kwargs)
+
+        key = response_cache.make_key(generation, request.path, request.args.items(multi=True))
+        etag = response_cache.etag(key)
+
+        if request.if_none_match.contains(etag) or (
+                not request.if_none_match and request.if_modified_since
+                and request.if_modified_since >= updated_at):
+            response = app.response_class(status=304)
+        else:
+            entry = response_cache.get(key)
+            if entry is None:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or g.get('uncacheable'):
+                    return response
+                entry = {'status': response.status_code, 'mimetype': response.mimetype,
+                         'body': response.get_data()}
+                response_cache.set(key, entry)
+            response = app.response_class(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+
+        response.set_etag(etag)
+        response.last_modified = updated_at
+        response.headers['Cache-Control'] = 'public, no-cache'
+        return response
+    return wrapper
+
+def listing_context(args, per_page=50):
+    """Template context for one listing page; also used by prerender.py"""
+    filters, where, params, total_inmates, fuzzy = search_filters(args)
+    page = max(1, int(args.get('page', 1)))
+    after = decode_cursor(args.get('after'))
+    before = decode_cursor(args.get('before'))
+
+    inmate_data, prev_cursor, next_cursor = fetch_page(where, params, after, before, per_page,
+                                                       offset=(page - 1) * per_page)
+    charges = load_charges([inmate['id'] for inmate in inmate_data])
+    for inmate in inmate_data:
+        inmate['charges'] = charges[inmate['id']]
+
+    filter_query = urlencode({k: v for k, v in filters.items() if v})
+    return {
+        'inmates': inmate_data,
+        'filters': filters,
+        'filter_query': filter_query,
+        **filters,
+        'page': page,
+        'total_pages': (total_inmates + per_page - 1) // per_page,
+        'has_prev': prev_cursor is not None,
+        'has_next': next_cursor is not None,
+        'prev_cursor': prev_cursor,
+        'next_cursor': next_cursor,
+        'first_url': f"?page=1&{filter_query}",
+        'prev_url': f"?before={prev_cursor}&page={page - 1}&{filter_query}",
+        'next_url': f"?after={next_cursor}&page={page + 1}&{filter_query}",
+        'facets': cached_facets(filters, fuzzy),
+        'total_inmates': total_inmates,
+    }
+
+def load_inmates(inmate_ids):
+    """Detail-page data for the given inmates rows, with their charges, by id"""
+    if not inmate_ids:
+        return {}
+    rows = row_dicts(db.session.execute(
+        text(f"SELECT {', '.join(INMATE_FIELDS)} FROM inmates WHERE id IN :ids").bindparams(
+            bindparam('ids', expanding=True)),
+        {'ids': list(inmate_ids)}
+    ))
+    inmates = {row['id']: row for row in rows}
+    charges = load_charges(list(inmates))
+    for inmate_id, inmate in inmates.items():
+        inmate['charges'] = charges[inmate_id]
+    return inmates
+
+def export_batches(args, after_id=0, chunk_size=EXPORT_CHUNK_SIZE):
+    """Inmates matching the listing filters in id order, with their charges, chunk_size at a time
+
+    The filters are checked straight away; the query runs once the batches are
+    iterated, and its rows are fetched from SQLite a chunk at a time.
+    """
+    filters = {field: (args.get(field) or '').strip() for field in FILTER_FIELDS}
+    where, params = filter_clause(filters)
+    params['after_id'] = after_id
+    query = text(f"SELECT {', '.join(INMATE_FIELDS)} FROM inmates{where} AND id > :after_id ORDER BY id")
+
+    def batches():
+        result = db.session.execute(query, params, execution_options={'stream_results': True})
+        keys = list(result.keys())
+        for rows in result.partitions(chunk_size):
+            inmates = [dict(zip(keys, row)) for row in rows]
+            charges = load_charges([inmate['id'] for inmate in inmates])
+            for inmate in inmates:
+                inmate['charges'] = charges[inmate['id']]
+            yield inmates
+    return batches()
 
 @app.route('/')
+@cached_response
 def index():
     try:
         # Verify database file exists
@@ -56,89 +478,14 @@ def index():
                                   heading='Database Not Found',
                                   error_message='The database file is missing. Please run the scraper first.')
 
-        # Get search parameters
-        search_name = request.args.get('search_name', '').strip()
-        search_race = request.args.get('search_race', '').strip()
-        search_gender = request.args.get('search_gender', '').strip()
-        page = int(request.args.get('page', 1))
-        per_page = 50
-
-        # Build query
-        query = "SELECT * FROM inmates WHERE 1=1"
-        params = []
-
-        if search_name:
-            query += " AND (last_name LIKE ? OR first_name LIKE ?)"
-            params.extend([f'%{search_name}%', f'%{search_name}%'])
-
-        if search_race:
-            query += " AND race LIKE ?"
-            params.append(f'%{search_race}%')
-
-        if search_gender:
-            query += " AND sex LIKE ?"
-            params.append(f'%{search_gender}%')
-
-        query += " ORDER BY booking_date DESC"
-
-        # Get total count for pagination
-        count_query = query.replace("SELECT * FROM inmates", "SELECT COUNT(*) FROM inmates")
-        total_inmates = db.session.execute(text(count_query), params).scalar()
-
-        # Add pagination
-        offset = (page - 1) * per_page
-        query += f" LIMIT {per_page} OFFSET {offset}"
-
-        inmates = db.session.execute(text(query), params).all()
-        inmate_data = []
-
-        for row in inmates:
-            try:
-                charges = json.loads(row.charges) if row.charges else []
-            except json.JSONDecodeError as e:
-                app.logger.error(f"Invalid JSON in charges for booking_num {row.booking_num}: {e}")
-                charges = []
-
-            inmate = {
-                'id': row.id,
-                'booking_num': row.booking_num,
-                'inmate_id': row.inmate_id,
-                'last_name': row.last_name,
-                'first_name': row.first_name,
-                'middle_name': row.middle_name,
-                'suffix': row.suffix,
-                'sex': row.sex,
-                'race': row.race,
-                'booking_date': row.booking_date,
-                'release_date': row.release_date,
-                'in_custody': row.in_custody,
-                'photo_link': row.photo_link,
-                'charges': charges,
-                'charge_count': len(charges)
-            }
-            inmate_data.append(inmate)
-
-        if not inmate_data and not any([search_name, search_race, search_gender]):
+        context = listing_context(request.args)
+        if not context['inmates'] and not any(context['filters'].values()):
             app.logger.warning("No inmates found in database")
             return render_template('error.html',
                                   heading='No Inmate Data',
                                   error_message='The database is empty. Please run the scraper to populate it.')
 
-        # Pagination info
-        total_pages = (total_inmates + per_page - 1) // per_page
-        has_prev = page > 1
-        has_next = page < total_pages
-
-        return render_template('index.html', 
-                             inmates=inmate_data,
-                             search_name=search_name,
-                             search_race=search_race,
-                             search_gender=search_gender,
-                             page=page,
-                             total_pages=total_pages,
-                             has_prev=has_prev,
-                             has_next=has_next,
-                             total_inmates=total_inmates)
+        return render_template('index.html', **context)
 
     except OperationalError as e:
         app.logger.error(f"Database error: {e}")
@@ -151,38 +498,47 @@ def index():
                               heading='Internal Server Error',
                               error_message='An unexpected error occurred. Please try again later.')
 
+@app.route('/api/inmates')
+@cached_response
+def api_inmates():
+    try:
+        filters, where, params, total, fuzzy = search_filters(request.args)
+        limit = min(max(1, int(request.args.get('limit', 50))), 500)
+        after = decode_cursor(request.args.get('after'))
+        before = decode_cursor(request.args.get('before'))
+
+        inmates, prev_cursor, next_cursor = fetch_page(where, params, after, before, limit)
+        charges = load_charges([inmate['id'] for inmate in inmates])
+        for inmate in inmates:
+            inmate['charges'] = charges[inmate['id']]
+
+        result = {
+            'inmates': inmates,
+            'total': total,
+            'prev_cursor': prev_cursor,
+            'next_cursor': next_cursor
+        }
+        if request.args.get('facets'):
+            result['facets'] = cached_facets(filters, fuzzy)
+        return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error in inmates API: {e}")
+        return jsonify({'error': 'An unexpected error occurred.'}), 500
+
 @app.route('/inmate/<int:inmate_id>')
+@cached_response
 def inmate_detail(inmate_id):
     try:
-        inmate = db.session.execute(text("SELECT * FROM inmates WHERE id = ?"), [inmate_id]).first()
+        inmate_data = load_inmates([inmate_id]).get(inmate_id)
         
-        if not inmate:
+        if not inmate_data:
             return render_template('error.html',
                                   heading='Inmate Not Found',
                                   error_message='The requested inmate could not be found.')
 
-        try:
-            charges = json.loads(inmate.charges) if inmate.charges else []
-        except json.JSONDecodeError:
-            charges = []
-
-        inmate_data = {
-            'id': inmate.id,
-            'booking_num': inmate.booking_num,
-            'inmate_id': inmate.inmate_id,
-            'last_name': inmate.last_name,
-            'first_name': inmate.first_name,
-            'middle_name': inmate.middle_name,
-            'suffix': inmate.suffix,
-            'sex': inmate.sex,
-            'race': inmate.race,
-            'booking_date': inmate.booking_date,
-            'release_date': inmate.release_date,
-            'in_custody': inmate.in_custody,
-            'photo_link': inmate.photo_link,
-            'charges': charges
-        }
-
         return render_template('inmate_detail.html', inmate=inmate_data)
 
     except Exception as e:
@@ -191,5 +547,67 @@ def inmate_detail(inmate_id):
                               heading='Error',
                               error_message='An error occurred while fetching inmate details.')
 
+@app.route('/stats')
+@cached_response
+def stats():
+    try:
+        stats_data = load_stats(stats_days(request.args))
+        busiest = max((day['count'] for day in stats_data['bookings_per_day']), default=0)
+        return render_template('stats.html', stats=stats_data, dimensions=STATS_DIMENSIONS, busiest=busiest)
+
+    except OperationalError as e:
+        app.logger.error(f"Database error: {e}")
+        return render_template('error.html',
+                              heading='Database Connection Failed',
+                              error_message='Unable to access inmate statistics. Please run the scraper first.')
+    except Exception as e:
+        app.logger.error(f"Error loading statistics: {e}")
+        return render_template('error.html',
+                              heading='Error',
+                              error_message='An error occurred while loading statistics.')
+
+@app.route('/api/stats')
+@cached_response
+def api_stats():
+    try:
+        return jsonify(load_stats(stats_days(request.args)))
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error in stats API: {e}")
+        return jsonify({'error': 'An unexpected error occurred.'}), 500
+
+@app.route('/export')
+def export():
+    """Stream every inmate matching the listing filters as one CSV, NDJSON or Parquet file"""
+    try:
+        export_format = request.args.get('format', 'csv')
+        compress = request.args.get('gzip') == '1'
+        after_id = max(0, int(request.args.get('after_id', 0)))
+        chunks = export_chunks(export_batches(request.args, after_id), export_format,
+                               INMATE_FIELDS, CHARGE_FIELDS, compress)
+
+        response = app.response_class(stream_with_context(chunks),
+                                      mimetype='application/gzip' if compress else EXPORT_FORMATS[export_format][0])
+        response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(export_format, compress)}"'
+        generation = data_generation()
+        if generation is not None:
+            response.headers['X-Data-Generation'] = str(generation)
+        return response
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Error starting export: {e}")
+        return jsonify({'error': 'An unexpected error occurred.'}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Request, query and render latency of this worker process; ?format=json for a summary"""
+    if request.args.get('format') == 'json':
+        return jsonify(request_timer.report())
+    return app.response_class(request_timer.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,435 @@
+"""Fetch backends for the inmate scraper.
+
+A backend hands out sessions; each session can run a booking date search
+(yielding the rows of every results page) and fetch a single detail page.
+The scraper only talks to sessions, so the Playwright and plain HTTP
+backends are interchangeable and return identical records.
+
+Sessions keep byte counters in `stats` so the cost of each page can be
+reported. Playwright sessions block images, media and fonts, serve scripts
+and stylesheets from an on-disk cache shared across runs (revalidated with
+the server once a day), and restore their cookies from a stored profile.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from extraction import (
+    DETAIL_READY_SELECTOR,
+    NEXT_PAGE_SELECTOR,
+    NO_RESULTS_TEXT,
+    RESULTS_SELECTOR,
+    extract_detail_page,
+    extract_list_rows,
+    node_text,
+    parse_detail_page,
+    parse_list_rows,
+)
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) FlaglerInmateScraper"
+
+# Resource types the extractors never look at
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font'}
+# Static assets served from the on-disk cache instead of being downloaded every run
+CACHED_RESOURCE_TYPES = {'stylesheet', 'script'}
+
+DEFAULT_ASSET_CACHE = '.playwright/assets'
+DEFAULT_PROFILE = '.playwright/storage_state.json'
+# Seconds a cached asset is served without asking the server whether it changed
+ASSET_MAX_AGE = 24 * 3600
+
+
+def new_session_stats():
+    return {'requests': 0, 'bytes': 0, 'blocked': 0, 'cached': 0, 'cached_bytes': 0, 'extract_seconds': 0.0}
+
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class AssetCache:
+    """Static assets stored on disk across runs, keyed by URL.
+
+    Entries older than max_age are revalidated with their ETag or
+    Last-Modified header before they are served again.
+    """
+    def __init__(self, directory, max_age=ASSET_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self, url):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name), os.path.join(self.directory, name + '.json')
+
+    def get(self, url):
+        """Return (metadata, body) for a cached asset, or None"""
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def is_fresh(self, meta):
+        return time.time() - meta.get('fetched_at', 0) < self.max_age
+
+    def validators(self, meta):
+        """Conditional request headers that let the server answer 304 Not Modified"""
+        headers = {}
+        if meta.get('etag'):
+            headers['if-none-match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['if-modified-since'] = meta['last_modified']
+        return headers
+
+    def put(self, url, content_type, body, headers=None):
+        body_path, meta_path = self.paths(url)
+        tmp_path = f"{body_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, body_path)
+        # The metadata file is written last, so a cache hit always has a complete body
+        self.put_meta(url, content_type, headers or {})
+
+    def put_meta(self, url, content_type, headers):
+        write_json_atomic(self.paths(url)[1], {
+            'url': url,
+            'content_type': content_type,
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'fetched_at': time.time(),
+        })
+
+    def refresh(self, url, meta):
+        """Mark a revalidated entry fresh again"""
+        self.put_meta(url, meta.get('content_type'), {'etag': meta.get('etag'),
+                                                      'last-modified': meta.get('last_modified')})
+
+
+class PlaywrightSession:
+    """One browser context and page"""
+    def __init__(self, context, page, block_resources=True, asset_cache=None, profile_path=None):
+        self.context = context
+        self.page = page
+        self.block_resources = block_resources
+        self.asset_cache = asset_cache
+        self.profile_path = profile_path
+        self.stats = new_session_stats()
+
+    async def handle_route(self, route):
+        """Drop assets extraction never needs and answer cacheable ones from disk"""
+        request = route.request
+        if self.block_resources and request.resource_type in BLOCKED_RESOURCE_TYPES:
+            self.stats['blocked'] += 1
+            await route.abort()
+            return
+
+        if self.asset_cache and request.resource_type in CACHED_RESOURCE_TYPES and request.method == 'GET':
+            cached = self.asset_cache.get(request.url)
+            if cached is not None and self.asset_cache.is_fresh(cached[0]):
+                await self.fulfill_cached(route, *cached)
+                return
+
+            headers = None
+            if cached is not None:
+                headers = {**request.headers, **self.asset_cache.validators(cached[0])}
+            response = await route.fetch(headers=headers)
+            self.stats['requests'] += 1
+            if response.status == 304 and cached is not None:
+                self.asset_cache.refresh(request.url, cached[0])
+                await self.fulfill_cached(route, *cached)
+                return
+
+            body = await response.body()
+            self.stats['bytes'] += len(body)
+            if response.status == 200:
+                self.asset_cache.put(request.url, response.headers.get('content-type'), body, response.headers)
+            await route.fulfill(response=response, body=body)
+            return
+
+        await route.continue_()
+
+    async def fulfill_cached(self, route, meta, body):
+        self.stats['cached'] += 1
+        self.stats['cached_bytes'] += len(body)
+        await route.fulfill(status=200, body=body, content_type=meta.get('content_type'))
+
+    async def on_request_finished(self, request):
+        # Cached asset types were already counted when they were routed
+        if self.asset_cache and request.resource_type in CACHED_RESOURCE_TYPES and request.method == 'GET':
+            return
+        sizes = await request.sizes()
+        self.stats['requests'] += 1
+        self.stats['bytes'] += sizes['responseBodySize'] + sizes['responseHeadersSize']
+
+    async def search(self, base_url, from_date, to_date):
+        """Submit the booking date search and yield the rows of each results page"""
+        logger.info("Navigating to inmate search page")
+        await self.page.goto(base_url, wait_until='domcontentloaded')
+
+        logger.info(f"Setting booking date range: {from_date} to {to_date}")
+        await self.page.fill('#uxBookingFromDate', from_date)
+        await self.page.fill('#uxBookingToDate', to_date)
+
+        logger.info("Clicking search button with date filters")
+        await self.page.click('input[type="submit"][value="Search"]')
+
+        # A timeout here propagates so the caller can retry the search
+        await self.page.wait_for_selector(RESULTS_SELECTOR, timeout=10000)
+
+        while True:
+            no_results = await self.page.query_selector_all(f'{RESULTS_SELECTOR}:has-text("{NO_RESULTS_TEXT}")')
+            if no_results:
+                logger.info("No records found for the specified date range")
+                return
+
+            yield await extract_list_rows(self.page)
+
+            next_link = await self.page.query_selector(NEXT_PAGE_SELECTOR)
+            if not next_link:
+                logger.info("No more pages found")
+                return
+
+            logger.info("Moving to next page")
+            await next_link.click()
+            await self.page.wait_for_selector(RESULTS_SELECTOR)
+
+    async def fetch_detail(self, url):
+        """Load a detail page and extract demographics, bookings and charges"""
+        # The data is in the server-rendered HTML, so there is no need to wait for the load event
+        await self.page.goto(url, wait_until='domcontentloaded')
+        await self.page.wait_for_selector(DETAIL_READY_SELECTOR)
+        started = time.monotonic()
+        try:
+            return await extract_detail_page(self.page)
+        finally:
+            self.stats['extract_seconds'] += time.monotonic() - started
+
+    async def close(self):
+        if self.profile_path:
+            try:
+                write_json_atomic(self.profile_path, await self.context.storage_state())
+            except Exception as e:
+                logger.warning(f"Could not save browser profile to {self.profile_path}: {e}")
+        await self.context.close()
+
+
+class PlaywrightBackend:
+    """Headless Chromium; every session gets its own browser context"""
+    name = 'playwright'
+
+    def __init__(self, headless=True, block_resources=True, asset_cache_dir=DEFAULT_ASSET_CACHE,
+                 profile_path=DEFAULT_PROFILE):
+        self.headless = headless
+        self.block_resources = block_resources
+        self.asset_cache = AssetCache(asset_cache_dir) if asset_cache_dir else None
+        self.profile_path = profile_path
+        self.playwright = None
+        self.browser = None
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+
+    async def open_session(self):
+        # Reuse cookies and local storage from earlier runs
+        storage_state = None
+        if self.profile_path:
+            os.makedirs(os.path.dirname(self.profile_path) or '.', exist_ok=True)
+            if os.path.exists(self.profile_path):
+                storage_state = self.profile_path
+        context = await self.browser.new_context(storage_state=storage_state, user_agent=USER_AGENT)
+
+        session = PlaywrightSession(context, None, self.block_resources, self.asset_cache, self.profile_path)
+        if self.block_resources or self.asset_cache:
+            await context.route('**/*', session.handle_route)
+        context.on('requestfinished', session.on_request_finished)
+        session.page = await context.new_page()
+        return session
+
+    async def close(self):
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+
+def search_form_request(tree, page_url, from_date, to_date):
+    """Build (method, url, fields) for submitting the booking date search form"""
+    from_input = tree.css_first('#uxBookingFromDate')
+    if from_input is None:
+        raise ValueError("Search form not found on inmate search page")
+
+    form = from_input.parent
+    while form is not None and form.tag != 'form':
+        form = form.parent
+    if form is None:
+        raise ValueError("Booking date fields are not inside a form")
+
+    fields = []
+    for node in form.css('input, select, textarea'):
+        name = node.attributes.get('name')
+        if not name:
+            continue
+        input_type = (node.attributes.get('type') or 'text').lower()
+
+        if node.tag == 'select':
+            option = node.css_first('option[selected]') or node.css_first('option')
+            value = (option.attributes.get('value') or node_text(option)) if option is not None else ''
+        elif node.tag == 'textarea':
+            value = node.text()
+        elif input_type in ('checkbox', 'radio'):
+            if 'checked' not in node.attributes:
+                continue
+            value = node.attributes.get('value') or 'on'
+        elif input_type in ('submit', 'button', 'image', 'reset'):
+            # Only the Search button is "clicked"
+            if node.attributes.get('value') != 'Search':
+                continue
+            value = 'Search'
+        else:
+            value = node.attributes.get('value') or ''
+
+        if node.attributes.get('id') == 'uxBookingFromDate':
+            value = from_date
+        elif node.attributes.get('id') == 'uxBookingToDate':
+            value = to_date
+        fields.append((name, value))
+
+    action = urljoin(page_url, form.attributes.get('action') or page_url)
+    method = (form.attributes.get('method') or 'GET').upper()
+    return method, action, fields
+
+
+class HttpSession:
+    """Browser-free session on a shared, pooled HTTP client"""
+    def __init__(self, client, recorder=None):
+        self.client = client
+        self.recorder = recorder
+        self.stats = new_session_stats()
+
+    async def request(self, method, url, **kwargs):
+        from selectolax.lexbor import LexborHTMLParser
+
+        response = await self.client.request(method, url, **kwargs)
+        self.stats['requests'] += 1
+        self.stats['bytes'] += len(response.content)
+        response.raise_for_status()
+        if self.recorder:
+            self.recorder.save(method, url, response.text)
+        return str(response.url), LexborHTMLParser(response.text)
+
+    async def search(self, base_url, from_date, to_date):
+        """Submit the booking date search and yield the rows of each results page"""
+        logger.info("Loading inmate search form")
+        page_url, tree = await self.request('GET', base_url)
+
+        logger.info(f"Submitting booking date range: {from_date} to {to_date}")
+        method, action, fields = search_form_request(tree, page_url, from_date, to_date)
+        if method == 'POST':
+            page_url, tree = await self.request('POST', action, content=urlencode(fields),
+                                                headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        else:
+            page_url, tree = await self.request('GET', action, params=fields)
+
+        while True:
+            results = tree.css_first(RESULTS_SELECTOR)
+            if results is None:
+                raise ValueError(f"{RESULTS_SELECTOR} not found on search results page")
+            if NO_RESULTS_TEXT in node_text(results):
+                logger.info("No records found for the specified date range")
+                return
+
+            yield parse_list_rows(tree)
+
+            next_link = tree.css_first(NEXT_PAGE_SELECTOR)
+            if next_link is None:
+                logger.info("No more pages found")
+                return
+
+            href = next_link.attributes.get('href') or ''
+            if urlsplit(href).scheme not in ('', 'http', 'https'):
+                logger.warning(f"Cannot follow scripted pager link {href!r}; stopping")
+                return
+
+            logger.info("Moving to next page")
+            page_url, tree = await self.request('GET', urljoin(page_url, href))
+
+    async def fetch_detail(self, url):
+        """Fetch a detail page and parse demographics, bookings and charges"""
+        _, tree = await self.request('GET', url)
+        if tree.css_first(DETAIL_READY_SELECTOR) is None:
+            raise ValueError(f"{DETAIL_READY_SELECTOR} not found on detail page")
+        started = time.monotonic()
+        try:
+            return parse_detail_page(tree)
+        finally:
+            self.stats['extract_seconds'] += time.monotonic() - started
+
+    async def close(self):
+        pass
+
+
+class HttpBackend:
+    """Pooled async HTTP client plus selectolax; no browser needed"""
+    name = 'http'
+
+    def __init__(self, concurrency=1, timeout=30, record_dir=None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.record_dir = record_dir
+        self.client = None
+        self.recorder = None
+
+    async def start(self):
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.concurrency + 1,
+                              max_keepalive_connections=self.concurrency + 1)
+        self.client = httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True,
+                                        headers={'User-Agent': USER_AGENT})
+        if self.record_dir:
+            from fixture_server import FixtureRecorder
+            self.recorder = FixtureRecorder(self.record_dir)
+
+    async def open_session(self):
+        return HttpSession(self.client, self.recorder)
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+        if self.recorder:
+            self.recorder.close()
+
+
+BACKENDS = {
+    PlaywrightBackend.name: PlaywrightBackend,
+    HttpBackend.name: HttpBackend,
+}
+
+
+def create_backend(name, concurrency=1, record_dir=None, block_resources=True,
+                   asset_cache_dir=DEFAULT_ASSET_CACHE, profile_path=DEFAULT_PROFILE):
+    """Instantiate a fetch backend by name"""
+    if name == HttpBackend.name:
+        return HttpBackend(concurrency=concurrency, record_dir=record_dir)
+    if name == PlaywrightBackend.name:
+        if record_dir:
+            logger.warning("Recording fixtures is only supported by the http backend")
+        return PlaywrightBackend(block_resources=block_resources, asset_cache_dir=asset_cache_dir,
+                                 profile_path=profile_path)
+    raise ValueError(f"Unknown backend {name!r}; choose from {', '.join(BACKENDS)}")
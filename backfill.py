@@ -0,0 +1,217 @@
+"""Rebuild or extend booking history over an arbitrary date range.
+
+The range is split into day or week shards that are scraped in parallel by
+separate worker processes, each with its own backend session. Workers never
+touch the database: each one streams its records to an NDJSON file, and the
+parent process merges finished shards into the database one at a time through
+the scraper's normal batched upsert, so there is only ever a single writer.
+
+Every merged shard is checkpointed in the backfill_shards table. Rerunning the
+same command skips finished shards, merges any shard files left over from an
+interrupted run, and scrapes the rest.
+
+    python backfill.py 2024-01-01 2024-12-31 --shard week --processes 6 --backend http
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from backends import BACKENDS, create_backend
+from deltas import DeltaWriter
+from run_metrics import RunMetrics
+from scraper import BASE_URL, FlaglerInmateScraper
+
+logger = logging.getLogger(__name__)
+
+SHARD_DAYS = {'day': 1, 'week': 7}
+FAILURES_KEY = '__failures__'
+
+
+def shard_ranges(start, end, shard='day'):
+    """Split [start, end] into consecutive, non-overlapping (from, to) date pairs"""
+    step = SHARD_DAYS[shard]
+    shards = []
+    current = start
+    while current <= end:
+        shards.append((current, min(current + timedelta(days=step - 1), end)))
+        current += timedelta(days=step)
+    return shards
+
+
+def shard_path(work_dir, shard):
+    return os.path.join(work_dir, f"shard-{shard[0].isoformat()}_{shard[1].isoformat()}.ndjson")
+
+
+def scrape_shard(shard, work_dir, base_url, backend, concurrency, rate, max_rate, batch_size):
+    """Worker process entry point: scrape one shard to an NDJSON file"""
+    return asyncio.run(scrape_shard_async(shard, work_dir, base_url, backend, concurrency, rate, max_rate,
+                                          batch_size))
+
+
+async def scrape_shard_async(shard, work_dir, base_url, backend, concurrency, rate, max_rate, batch_size):
+    # The workers only need the scraping half of the scraper; state lives in the parent's database
+    scraper = FlaglerInmateScraper(base_url=base_url, db_path=':memory:')
+    date_range = (shard[0].strftime("%m/%d/%Y"), shard[1].strftime("%m/%d/%Y"))
+    path = shard_path(work_dir, shard)
+    part_path = path + '.part'
+
+    fetch_backend = create_backend(backend, concurrency=concurrency)
+    try:
+        await fetch_backend.start()
+        with open(part_path, 'w', encoding='utf-8') as f:
+            def write_batch(batch):
+                for inmate in batch:
+                    f.write(json.dumps(inmate) + '\n')
+
+            failures, _ = await scraper.scrape(fetch_backend, write_batch, concurrency=concurrency, rate=rate,
+                                               incremental=False, batch_size=batch_size, date_range=date_range,
+                                               max_rate=max_rate, retry_failed=False)
+            # Trailer line, so a shard merged after an interruption still knows it was incomplete
+            f.write(json.dumps({FAILURES_KEY: len(failures)}) + '\n')
+    finally:
+        await fetch_backend.close()
+
+    # Only a complete shard file is ever visible under its final name
+    os.replace(part_path, path)
+    return path
+
+
+def finished_shards(cursor):
+    cursor.execute("SELECT shard_from, shard_to FROM backfill_shards WHERE status = 'done'")
+    return {(date.fromisoformat(shard_from), date.fromisoformat(shard_to)) for shard_from, shard_to in cursor.fetchall()}
+
+
+def record_shard(cursor, shard, status, records=0, failures=0, error=None):
+    cursor.execute('''
+        INSERT OR REPLACE INTO backfill_shards (shard_from, shard_to, status, records, failures, error, finished_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (shard[0].isoformat(), shard[1].isoformat(), status, records, failures, error,
+          datetime.now().isoformat(timespec='seconds')))
+
+
+def merge_shard(scraper, cursor, shard, path, counts, batch_size=500):
+    """Upsert a finished shard file into the database and checkpoint it"""
+    records = 0
+    failures = 0
+    batch = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            inmate = json.loads(line)
+            if FAILURES_KEY in inmate:
+                failures = inmate[FAILURES_KEY]
+                continue
+            batch.append(inmate)
+            if len(batch) >= batch_size:
+                scraper.save_batch(cursor, batch, counts)
+                records += len(batch)
+                batch = []
+    if batch:
+        scraper.save_batch(cursor, batch, counts)
+        records += len(batch)
+
+    # Shards with failed detail pages are scraped again on the next run
+    status = 'partial' if failures else 'done'
+    record_shard(cursor, shard, status, records, failures)
+    os.remove(path)
+    logger.info(f"Merged shard {shard[0]} to {shard[1]}: {records} inmates, {failures} failures ({status})")
+
+
+def backfill(start, end, db_path="volusia_inmates.db", shard='day', processes=4, backend='http',
+             concurrency=2, rate=1.0, base_url=BASE_URL, work_dir=None, batch_size=500, delta_dir=None,
+             max_rate=None):
+    """Scrape every shard of [start, end] that has not been merged yet
+
+    rate and max_rate are requests per second for the whole backfill; each worker
+    process gets an equal share of both. max_rate defaults to rate, so the adaptive
+    limiters never take the total above the requested rate.
+    """
+    scraper = FlaglerInmateScraper(base_url=base_url, db_path=db_path)
+    scraper.metrics = RunMetrics(backend=backend, mode='backfill')
+    work_dir = work_dir or f"{db_path}.backfill"
+    os.makedirs(work_dir, exist_ok=True)
+
+    conn = scraper.connect()
+    cursor = conn.cursor()
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+    if delta_dir:
+        scraper.changes = DeltaWriter(delta_dir, scraper.generation(cursor))
+
+    shards = shard_ranges(start, end, shard)
+    done = finished_shards(cursor)
+    pending = [s for s in shards if s not in done]
+    logger.info(f"Backfill {start} to {end}: {len(shards)} {shard} shards, {len(shards) - len(pending)} already done")
+
+    try:
+        # Shard files that were scraped but never merged before an interruption
+        to_scrape = []
+        for s in pending:
+            if os.path.exists(shard_path(work_dir, s)):
+                merge_shard(scraper, cursor, s, shard_path(work_dir, s), counts, batch_size)
+            else:
+                to_scrape.append(s)
+
+        if to_scrape:
+            # The request budget is global: split it across the processes that run at once
+            workers = min(processes, len(to_scrape))
+            process_rate = rate / workers
+            process_max_rate = (max_rate or rate) / workers
+            logger.info(f"Scraping {len(to_scrape)} shards in {workers} processes with {concurrency} workers each, "
+                        f"{rate} requests/sec in total ({process_rate:.2f} per process, "
+                        f"adapting up to {process_max_rate:.2f})")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(scrape_shard, s, work_dir, base_url, backend, concurrency, process_rate,
+                                process_max_rate, batch_size): s
+                    for s in to_scrape
+                }
+                for future in as_completed(futures):
+                    s = futures[future]
+                    try:
+                        path = future.result()
+                    except Exception as e:
+                        logger.error(f"Shard {s[0]} to {s[1]} failed: {e}")
+                        record_shard(cursor, s, 'failed', error=str(e))
+                        continue
+                    merge_shard(scraper, cursor, s, path, counts, batch_size)
+                    scraper.metrics.inc('shards_merged')
+
+        remaining = len(shards) - len(finished_shards(cursor) & set(shards))
+        if remaining:
+            logger.warning(f"{remaining} shards are incomplete; rerun the same command to retry them")
+    finally:
+        scraper.finish_saving(conn, counts)
+    return counts
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Backfill Flagler County bookings over a date range")
+    parser.add_argument('start', type=date.fromisoformat, help="First booking date, YYYY-MM-DD")
+    parser.add_argument('end', type=date.fromisoformat, nargs='?', default=date.today(),
+                        help="Last booking date, YYYY-MM-DD (default: today)")
+    parser.add_argument('--shard', choices=sorted(SHARD_DAYS), default='day', help="Size of each date window")
+    parser.add_argument('--processes', type=int, default=4, help="Shards scraped in parallel")
+    parser.add_argument('--concurrency', type=int, default=2, help="Detail workers per process")
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help="Detail requests per second for the whole backfill, shared by all processes")
+    parser.add_argument('--max-rate', type=float,
+                        help="Total requests per second the adaptive rate may climb to (default: --rate)")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='http',
+                        help="Fetch pages with headless Chromium or a plain HTTP client")
+    parser.add_argument('--base-url', default=BASE_URL, help="Inmate inquiry URL, e.g. a local fixture server")
+    parser.add_argument('--db', default="volusia_inmates.db", help="Database to merge into")
+    parser.add_argument('--work-dir', help="Where shard files are staged (default: <db>.backfill)")
+    parser.add_argument('--batch-size', type=int, default=500, help="Inmates written per database transaction")
+    parser.add_argument('--deltas', metavar='DIR', help="Also write the merged changes to DIR as a compressed delta file")
+    args = parser.parse_args()
+
+    if args.start > args.end:
+        parser.error("start must not be after end")
+
+    backfill(args.start, args.end, db_path=args.db, shard=args.shard, processes=args.processes,
+             backend=args.backend, concurrency=args.concurrency, rate=args.rate, base_url=args.base_url,
+             work_dir=args.work_dir, batch_size=args.batch_size, delta_dir=args.deltas, max_rate=args.max_rate)
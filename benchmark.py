@@ -0,0 +1,349 @@
+"""Repeatable performance benchmarks for the web app, the database writer and the parsers.
+
+    python benchmark.py --inmates 100000 --output bench.json
+    python benchmark.py --inmates 100000 --output new.json --compare bench.json
+
+web     Flask test-client latency for the listing, filters, name search, deep
+        offset and keyset pagination, the JSON API and detail pages, against a
+        synthetic database (generated once and kept under .benchmarks/), plus
+        the import time and first request of a fresh worker process.
+write   save_batch throughput for inserts, unchanged rows and updates.
+parse   selectolax parse throughput for detail and results pages, from a
+        recorded fixture directory or from synthetic pages.
+
+Results are written as JSON. --compare reports the change in each benchmark's
+headline number against an earlier results file and exits non-zero when any of
+them regressed by more than --threshold.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from synthetic_data import generate_database, render_detail_page, render_results_page, synthetic_inmates
+
+logger = logging.getLogger(__name__)
+
+BENCH_DIR = '.benchmarks'
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Stand-ins for deployment templates that are not kept in this repository
+FALLBACK_TEMPLATES = {
+    'error.html': '<h1>{{ heading }}</h1><p>{{ error_message }}</p>',
+    'inmate_detail.html': (
+        '<h1>{{ inmate.last_name }}, {{ inmate.first_name }}</h1>'
+        '<p>{{ inmate.booking_num }} {{ inmate.booking_date }} {{ inmate.release_date }}</p>'
+        '<table>{% for charge in inmate.charges %}<tr>{% for key, value in charge.items() %}'
+        '<td>{{ value }}</td>{% endfor %}</tr>{% endfor %}</table>'
+    ),
+}
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+    }
+
+
+def time_calls(fn, repeat, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def benchmark_database(inmates, seed=1):
+    """Directory holding a synthetic volusia_inmates.db of the given size, generated on first use"""
+    directory = os.path.abspath(os.path.join(BENCH_DIR, f'inmates-{inmates}-seed{seed}'))
+    db_path = os.path.join(directory, 'volusia_inmates.db')
+    if not os.path.exists(db_path):
+        os.makedirs(directory, exist_ok=True)
+        logger.info(f"Generating a synthetic database with {inmates:,} inmates in {directory}")
+        generate_database(db_path, inmates, seed)
+    return directory
+
+
+def template_dir(templates=None):
+    """Directory with the repo's templates plus any templates it does not ship"""
+    directory = tempfile.mkdtemp(prefix='bench-templates-')
+    for name in ('index.html', 'stats.html'):
+        shutil.copy(os.path.join(REPO_DIR, name), directory)
+    for name, source in FALLBACK_TEMPLATES.items():
+        candidate = os.path.join(templates or os.path.join(REPO_DIR, 'templates'), name)
+        if os.path.exists(candidate):
+            shutil.copy(candidate, directory)
+        else:
+            with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+                f.write(source)
+    return directory
+
+
+COLD_START_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/api/inmates?limit=50')
+assert response.status_code == 200, response.status_code
+print(json.dumps([imported - started, time.perf_counter() - imported]))
+'''
+
+
+def cold_start_benchmarks(db_dir, repeat=5):
+    """Import time and first-request latency of a fresh worker process, as Passenger starts one"""
+    imports, first_requests = [], []
+    for _ in range(repeat):
+        env = {**os.environ, 'PYTHONPATH': REPO_DIR}
+        env.pop('FLASK_DEBUG', None)
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT], cwd=db_dir, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        imported, first_request = json.loads(output.strip().splitlines()[-1])
+        imports.append(imported)
+        first_requests.append(first_request)
+    return {
+        'web.cold_import': summarize(imports),
+        'web.cold_first_request': summarize(first_requests),
+    }
+
+
+def web_benchmarks(db_dir, repeat=20, templates=None, seed=1):
+    """Flask test-client latency per route, without and with the response cache"""
+    # The app opens volusia_inmates.db relative to the working directory at import time
+    os.chdir(db_dir)
+    logging.disable(logging.CRITICAL)
+    import app as app_module
+    logging.disable(logging.NOTSET)
+
+    flask_app = app_module.app
+    flask_app.template_folder = template_dir(templates)
+    with flask_app.app_context():
+        app_module.db.engine.echo = False
+        total = app_module.db.session.execute(app_module.text('SELECT COUNT(*) FROM inmates')).scalar()
+        ids = [row[0] for row in app_module.db.session.execute(app_module.text('SELECT id FROM inmates'))]
+    client = flask_app.test_client()
+
+    # Walk the keyset cursors to a realistic deep page before timing it
+    depth = min(200, max(1, total // 50 - 1))
+    url = '/api/inmates?limit=50'
+    for _ in range(depth):
+        next_cursor = client.get(url).get_json().get('next_cursor')
+        if not next_cursor:
+            break
+        url = f'/api/inmates?limit=50&after={next_cursor}'
+    deep_cursor = url.rsplit('after=', 1)[-1] if 'after=' in url else ''
+
+    rng = random.Random(seed)
+    detail_ids = iter(rng.choices(ids, k=repeat * 3 + 10))
+    scenarios = {
+        'listing': lambda: '/',
+        'filter_race_sex': lambda: '/?search_race=BLACK&search_gender=Female',
+        'filter_dates_custody': lambda: '/?booked_from=2024-01-01&booked_to=2024-06-30&custody=released',
+        'search_name': lambda: '/?search_name=SMITH',
+        'search_prefix': lambda: '/?search_name=JOH',
+        'search_fuzzy': lambda: '/?search_name=JONSON',
+        'search_charge': lambda: '/?charge=batt',
+        'filter_crime_class': lambda: '/?crime_class=F3&agency=BUNNELL+PD',
+        'deep_offset': lambda: f'/?page={depth}',
+        'deep_keyset': lambda: f'/?after={deep_cursor}',
+        'api_page': lambda: '/api/inmates?limit=100',
+        'detail': lambda: f'/inmate/{next(detail_ids)}',
+        'stats': lambda: '/stats?days=365',
+        'api_stats': lambda: '/api/stats?days=365',
+        'export_filtered': lambda: '/export?format=ndjson&crime_class=F3&agency=BUNNELL+PD',
+    }
+
+    results = {}
+    logging.disable(logging.CRITICAL)
+    try:
+        for cached in (False, True):
+            # A zero-sized cache forgets every entry immediately
+            app_module.response_cache.entries.clear()
+            app_module.response_cache.max_entries = 512 if cached else 0
+            for name, make_url in scenarios.items():
+                def request():
+                    response = client.get(make_url())
+                    assert response.status_code == 200, f"{name}: HTTP {response.status_code}"
+                results[f"web{'_cached' if cached else ''}.{name}"] = summarize(time_calls(request, repeat))
+    finally:
+        logging.disable(logging.NOTSET)
+    return results
+
+
+def write_benchmarks(rows=20000, batch_size=500, seed=2):
+    """save_batch throughput for new, unchanged and changed rows"""
+    from run_metrics import RunMetrics
+    from scraper import FlaglerInmateScraper
+
+    directory = tempfile.mkdtemp(prefix='bench-write-')
+    try:
+        scraper = FlaglerInmateScraper(db_path=os.path.join(directory, 'write.db'))
+        scraper.metrics = RunMetrics(backend='benchmark')
+        inmates = list(synthetic_inmates(rows, seed))
+        changed = [{**inmate, 'bookings': [{**inmate['bookings'][0], 'release_date': '01/01/2025 09:00 AM'},
+                                           *inmate['bookings'][1:]]}
+                   if i % 10 == 0 else inmate for i, inmate in enumerate(inmates)]
+
+        results = {}
+        conn = scraper.connect()
+        cursor = conn.cursor()
+        for name, data in (('insert', inmates), ('unchanged', inmates), ('update_10pct', changed)):
+            counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+            started = time.perf_counter()
+            for start in range(0, len(data), batch_size):
+                scraper.save_batch(cursor, data[start:start + batch_size], counts)
+            elapsed = time.perf_counter() - started
+            results[f'write.{name}'] = {'rows': len(data), 'seconds': round(elapsed, 3),
+                                        'rows_per_sec': round(len(data) / elapsed, 1), **counts}
+        conn.close()
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def load_fixture_pages(directory):
+    from fixture_server import load_manifest
+
+    pages = []
+    for filename in sorted(set(load_manifest(directory).values())):
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def parse_benchmarks(fixtures=None, repeat=5, seed=3):
+    """Parse throughput for detail and results pages"""
+    from selectolax.lexbor import LexborHTMLParser
+
+    from extraction import DETAIL_READY_SELECTOR, RESULTS_SELECTOR, parse_detail_page, parse_list_rows
+
+    if fixtures:
+        pages = load_fixture_pages(fixtures)
+        detail_pages = [page for page in pages if LexborHTMLParser(page).css_first(DETAIL_READY_SELECTOR)]
+        list_pages = [page for page in pages if LexborHTMLParser(page).css_first(RESULTS_SELECTOR)]
+    else:
+        inmates = list(synthetic_inmates(500, seed))
+        detail_pages = [render_detail_page(inmate) for inmate in inmates]
+        list_pages = [render_results_page(inmates[start:start + 50]) for start in range(0, len(inmates), 50)]
+
+    results = {}
+    for name, pages, parse in (('detail', detail_pages, parse_detail_page), ('list', list_pages, parse_list_rows)):
+        if not pages:
+            continue
+        total_bytes = sum(len(page.encode('utf-8')) for page in pages)
+        samples = time_calls(lambda: [parse(LexborHTMLParser(page)) for page in pages], repeat, warmup=1)
+        best = min(samples)
+        results[f'parse.{name}'] = {
+            'pages': len(pages),
+            'pages_per_sec': round(len(pages) / best, 1),
+            'mb_per_sec': round(total_bytes / best / 1e6, 2),
+            'source': 'fixtures' if fixtures else 'synthetic',
+        }
+    return results
+
+
+def headline(result):
+    """(metric, value, higher_is_better) used to compare a benchmark between runs"""
+    for metric in ('rows_per_sec', 'pages_per_sec'):
+        if metric in result:
+            return metric, result[metric], True
+    return 'p50_ms', result['p50_ms'], False
+
+
+def compare(results, baseline, threshold=0.2):
+    """Log each benchmark's change against a baseline and return the names that regressed"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        metric, value, higher_is_better = headline(result)
+        previous = baseline[name].get(metric)
+        if not previous:
+            continue
+        change = (value - previous) / previous
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        logger.info(f"{name:32} {metric:14} {previous:>12} -> {value:>12} ({change:+.1%}){flag}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark the web app, database writes and page parsing")
+    parser.add_argument('--only', default='web,write,parse', help="Comma-separated suites to run")
+    parser.add_argument('--inmates', type=int, default=100000, help="Size of the synthetic database for web benchmarks")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the synthetic database")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed requests per web scenario")
+    parser.add_argument('--write-rows', type=int, default=20000, help="Rows written per write benchmark")
+    parser.add_argument('--fixtures', help="Recorded fixture directory for the parse benchmarks")
+    parser.add_argument('--templates', help="Directory with deployment templates (error.html, inmate_detail.html)")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the results")
+    parser.add_argument('--compare', metavar='BASELINE', help="Earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    suites = set(args.only.split(','))
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    fixtures = os.path.abspath(args.fixtures) if args.fixtures else None
+    templates = os.path.abspath(args.templates) if args.templates else None
+
+    results = {}
+    if 'write' in suites:
+        results.update(write_benchmarks(args.write_rows))
+    if 'parse' in suites:
+        results.update(parse_benchmarks(fixtures))
+    # Last, because it changes the working directory
+    if 'web' in suites:
+        results.update(cold_start_benchmarks(benchmark_database(args.inmates, args.seed)))
+        results.update(web_benchmarks(benchmark_database(args.inmates, args.seed), args.repeat,
+                                      templates, args.seed))
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'inmates': args.inmates,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {len(results)} benchmark results to {output}")
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        if regressions:
+            logger.error(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+            raise SystemExit(1)
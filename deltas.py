@@ -0,0 +1,128 @@
+"""Compressed change files for shipping database updates instead of the database.
+
+A delta holds the inmates one run inserted or updated, as gzipped NDJSON: a
+header line, then one line per changed inmate with its full row (including its
+id, so /inmate/<id> URLs agree everywhere the delta is applied), its bookings
+and charges, and one line per updated scrape_state row. The header names the
+data generation the delta applies on top of and the generation it produces,
+so deltas chain and can only be applied in order.
+
+A snapshot is the same format with "full": true and every inmate in it.
+Files are written without a gzip timestamp, so identical content gives
+identical bytes.
+"""
+import gzip
+import io
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+HEADER_KEY = '__delta__'
+FORMAT_VERSION = 1
+
+
+def delta_path(delta_dir, generation):
+    return os.path.join(delta_dir, f"delta-{generation:08d}.ndjson.gz")
+
+
+def delta_files(delta_dir):
+    """Delta files in a directory, oldest generation first"""
+    if not delta_dir or not os.path.isdir(delta_dir):
+        return []
+    names = sorted(name for name in os.listdir(delta_dir) if name.startswith('delta-') and name.endswith('.ndjson.gz'))
+    return [os.path.join(delta_dir, name) for name in names]
+
+
+def make_header(generation, base_generation=None, full=False):
+    return {
+        HEADER_KEY: FORMAT_VERSION,
+        'base_generation': base_generation,
+        'generation': generation,
+        'full': full,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def read_delta(path):
+    """Yield the header of a delta or snapshot file, then each of its records"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for number, line in enumerate(f):
+            record = json.loads(line)
+            if number == 0 and record.get(HEADER_KEY) != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} delta file")
+            yield record
+
+
+def read_header(path):
+    records = read_delta(path)
+    try:
+        return next(records)
+    finally:
+        records.close()
+
+
+class ChangeFile:
+    """A delta or snapshot being written; only visible under its final name once closed"""
+    def __init__(self, path, header):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.records = 0
+        raw = open(self.part_path, 'wb')
+        self.file = io.TextIOWrapper(gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0), encoding='utf-8')
+        self.raw = raw
+        self.file.write(json.dumps(header) + '\n')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.records += 1
+
+    def close(self):
+        self.file.close()
+        self.raw.close()
+        os.replace(self.part_path, self.path)
+        return os.path.getsize(self.path)
+
+    def discard(self):
+        self.file.close()
+        self.raw.close()
+        os.remove(self.part_path)
+
+
+class DeltaWriter:
+    """Collects one run's inserts and updates into the delta on top of base_generation
+
+    The file is only created once something changes, and is published by
+    finish() with the generation the run ended on.
+    """
+    def __init__(self, delta_dir, base_generation):
+        self.delta_dir = delta_dir
+        self.base_generation = base_generation
+        self.file = None
+
+    def record(self, records):
+        if self.file is None:
+            os.makedirs(self.delta_dir, exist_ok=True)
+            generation = self.base_generation + 1
+            self.file = ChangeFile(delta_path(self.delta_dir, generation), make_header(generation, self.base_generation))
+        for record in records:
+            self.file.write(record)
+
+    def finish(self, generation):
+        """Publish the delta; returns (path, size in bytes), or None if nothing changed"""
+        if self.file is None:
+            return None
+        if generation != self.base_generation + 1:
+            # Someone else wrote to the database during the run, so this delta would not chain
+            self.file.discard()
+            self.file = None
+            logger.error(f"Database moved from generation {self.base_generation} to {generation} during the run; "
+                         f"delta discarded, rebuild the base snapshot with `python snapshots.py compact`")
+            return None
+        size = self.file.close()
+        path = self.file.path
+        logger.info(f"Wrote delta {path}: {self.file.records} records, {size / 1024:.1f} KB")
+        self.file = None
+        return path, size
@@ -0,0 +1,172 @@
+"""Bulk exports of the inmate data as CSV, NDJSON or Parquet.
+
+An export streams every inmate matching the listing filters, with its charges,
+in id order from a single query whose rows are fetched a chunk at a time, so
+memory stays flat however large the export is and the whole export reads one
+consistent snapshot of the database. Each record carries its id; an export
+that was cut off resumes with after_id set to the last id received.
+
+The web app serves exports on /export; from the command line:
+
+    python exports.py --format csv --output inmates.csv.gz --gzip
+    python exports.py --format ndjson --filter custody=in --after-id 12000
+
+CSV rows hold the charges as a JSON array. Parquet needs pyarrow, which is not
+installed with the app (pip install pyarrow); it is compressed internally, so
+it cannot be gzipped on top.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Format -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+EXPORT_CHUNK_SIZE = 1000
+INTEGER_FIELDS = {'id', 'charge_count'}
+
+
+def csv_chunks(batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields + ['charges'])
+    for batch in batches:
+        writer.writerows([inmate[field] for field in fields] + [json.dumps(inmate['charges'])] for inmate in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def ndjson_chunks(batches):
+    for batch in batches:
+        yield ''.join(json.dumps(inmate, separators=(',', ':')) + '\n' for inmate in batch).encode('utf-8')
+
+
+class ChunkSink:
+    """Write-only file object that hands what was written back in pieces"""
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        return data
+
+
+def parquet_chunks(batches, fields, charge_fields):
+    """One Parquet row group per batch, with the charges as a nested list"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet exports need pyarrow; install it with `pip install pyarrow`")
+
+    charge_type = pa.struct([(field, pa.string()) for field in ['booking_num'] + charge_fields])
+    schema = pa.schema([(field, pa.int64() if field in INTEGER_FIELDS else pa.string()) for field in fields]
+                       + [('charges', pa.list_(charge_type))])
+
+    # Checked for pyarrow before the first chunk is asked for, so a web export can still answer 400
+    def row_groups():
+        sink = ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        try:
+            for batch in batches:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                yield sink.take()
+        finally:
+            writer.close()
+        yield sink.take()
+    return row_groups()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(batches, export_format, fields, charge_fields, compress=False):
+    """Encode batches of inmates (each with its charges) as the bytes of an export file"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}; use one of {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'csv':
+        chunks = csv_chunks(batches, fields)
+    elif export_format == 'ndjson':
+        chunks = ndjson_chunks(batches)
+    else:
+        if compress:
+            raise ValueError("Parquet exports are already compressed; leave out gzip")
+        chunks = parquet_chunks(batches, fields, charge_fields)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_filename(export_format, compress=False):
+    return f"inmates.{EXPORT_FORMATS[export_format][1]}{'.gz' if compress else ''}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the inmate database as CSV, NDJSON or Parquet")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', help="Export file format")
+    parser.add_argument('--output', help="File to write (default: standard output)")
+    parser.add_argument('--gzip', action='store_true', help="Gzip the CSV or NDJSON output")
+    parser.add_argument('--after-id', type=int, default=0, help="Resume after this inmate id")
+    parser.add_argument('--filter', action='append', default=[], metavar='FIELD=VALUE',
+                        help="Listing filter, as in the site's query string (repeatable)")
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="Inmates fetched per chunk")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Imported here because the app imports this module for its /export route
+    from app import CHARGE_FIELDS, FILTER_FIELDS, INMATE_FIELDS, app, export_batches
+
+    filters = dict(item.partition('=')[::2] for item in args.filter)
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        parser.error(f"Unknown filters {', '.join(sorted(unknown))}; use {', '.join(FILTER_FIELDS)}")
+
+    written = 0
+    with app.app_context():
+        try:
+            chunks = export_chunks(export_batches(filters, args.after_id, args.chunk_size), args.format,
+                                   INMATE_FIELDS, CHARGE_FIELDS, args.gzip)
+        except ValueError as e:
+            parser.error(str(e))
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if args.output:
+                output.close()
+    logger.info(f"Wrote {written / 1024:.0f} KB of {args.format} to {args.output or 'standard output'}")
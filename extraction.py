@@ -0,0 +1,234 @@
+"""Declarative field maps and extractors for the NewWorld inmate pages.
+
+The same field maps drive two extractors: JavaScript that runs inside the
+browser and returns a whole results table or detail page in a single round
+trip, and a parser over server-rendered HTML for the browser-free backend.
+Both return identical dicts.
+"""
+import re
+
+# Cells read from each row of the search results table (key -> selector inside the row)
+LIST_FIELDS = {
+    'name': 'td.Name a',
+    'subject_number': 'td.SubjectNumber',
+    'race': 'td.Race',
+    'gender': 'td.Gender',
+    'dob': 'td.DateOfBirth',
+    'height': 'td.Height',
+    'weight': 'td.Weight',
+}
+
+# Attributes read from each results row (key -> [selector, attribute])
+LIST_ATTRIBUTES = {
+    'detail_link': ['td.Name a', 'href'],
+}
+
+LIST_ROW_SELECTOR = 'tbody tr'
+RESULTS_SELECTOR = '.Results'
+NO_RESULTS_TEXT = 'No records found'
+NEXT_PAGE_SELECTOR = 'a.Next[href]'
+DETAIL_READY_SELECTOR = '#Inmate_Detail'
+
+# Charge table columns, in the order they appear on the detail page
+CHARGE_COLUMNS = [
+    'seq_number',
+    'charge_description',
+    'counts',
+    'offense_date',
+    'docket_number',
+    'sentence_date',
+    'disposition',
+    'disposition_date',
+    'sentence_length',
+    'crime_class',
+    'arresting_agencies',
+    'attempt_commit',
+    'charge_bond',
+]
+
+DETAIL_FIELDS = {
+    'demographics': '#DemographicInformation ul.FieldList li',
+    'bookings': '#BookingHistory .Booking',
+    'booking_number': 'h3 span',
+    'booking_fields': 'ul.FieldList li',
+    'charge_rows': '.BookingCharges tbody tr',
+    'charge_columns': CHARGE_COLUMNS,
+}
+
+# Runs against every results row at once via page.eval_on_selector_all
+LIST_ROWS_JS = """
+(rows, spec) => {
+    const text = (root, selector) => {
+        const el = root.querySelector(selector);
+        return el ? el.innerText : '';
+    };
+    const records = [];
+    for (const row of rows) {
+        if (!row.querySelector(spec.fields.name)) continue;
+        const record = {};
+        for (const [key, selector] of Object.entries(spec.fields)) {
+            record[key] = text(row, selector);
+        }
+        for (const [key, [selector, attribute]] of Object.entries(spec.attributes)) {
+            const el = row.querySelector(selector);
+            record[key] = el ? el.getAttribute(attribute) : null;
+        }
+        records.push(record);
+    }
+    return records;
+}
+"""
+
+# Runs once per detail page via page.evaluate
+DETAIL_PAGE_JS = """
+(spec) => {
+    const fieldList = (items) => {
+        const fields = {};
+        for (const item of items) {
+            const label = item.querySelector('label');
+            const span = item.querySelector('span');
+            if (label && span) {
+                fields[label.innerText.toLowerCase().replace(/ /g, '_')] = span.innerText;
+            }
+        }
+        return fields;
+    };
+    const demographics = fieldList(document.querySelectorAll(spec.demographics));
+    const bookings = [];
+    for (const section of document.querySelectorAll(spec.bookings)) {
+        const booking = {};
+        const header = section.querySelector(spec.booking_number);
+        if (header) booking.booking_number = header.innerText;
+        Object.assign(booking, fieldList(section.querySelectorAll(spec.booking_fields)));
+        const charges = [];
+        for (const row of section.querySelectorAll(spec.charge_rows)) {
+            const cells = row.querySelectorAll('td');
+            if (cells.length < spec.charge_columns.length) continue;
+            const charge = {};
+            spec.charge_columns.forEach((column, i) => { charge[column] = cells[i].innerText; });
+            charges.push(charge);
+        }
+        booking.charges = charges;
+        bookings.push(booking);
+    }
+    return {demographics, bookings};
+}
+"""
+
+
+async def extract_list_rows(page):
+    """Pull every row of the current results page in one call"""
+    spec = {'fields': LIST_FIELDS, 'attributes': LIST_ATTRIBUTES}
+    return await page.eval_on_selector_all(LIST_ROW_SELECTOR, LIST_ROWS_JS, spec)
+
+
+async def extract_detail_page(page):
+    """Pull demographics, bookings and charges from a loaded detail page in one call"""
+    return await page.evaluate(DETAIL_PAGE_JS, DETAIL_FIELDS)
+
+
+# Elements innerText puts on lines of their own, with the number of line breaks around them
+BLOCK_LINE_BREAKS = dict.fromkeys([
+    'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figure', 'footer',
+    'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'section',
+    'table', 'tr', 'ul',
+], 1)
+BLOCK_LINE_BREAKS['p'] = 2
+HIDDEN_TAGS = {'script', 'style', 'template', 'noscript', 'head'}
+
+
+def text_items(node, items):
+    """Collect the text runs and required line breaks (as ints) of node's children, like innerText"""
+    for child in node.iter(include_text=True):
+        tag = child.tag
+        if tag == '-text':
+            items.append(re.sub(r'\s+', ' ', child.text(deep=False)))
+        elif tag == 'br':
+            items.append('\n')
+        elif tag not in HIDDEN_TAGS:
+            breaks = BLOCK_LINE_BREAKS.get(tag, 0)
+            if breaks:
+                items.append(breaks)
+            text_items(child, items)
+            if breaks:
+                items.append(breaks)
+            elif tag in ('td', 'th'):
+                items.append('\t')
+
+
+def node_text(node):
+    """Approximate innerText for a parsed HTML node
+    
+    Runs of whitespace collapse to one space, and lines are trimmed. <br> and block
+    elements start new lines, as they do in the browser, so the HTTP and Playwright
+    backends read multi-line cells the same way.
+    """
+    if node is None:
+        return ''
+    child = node.child
+    if child is None:
+        return ''
+    if child.next is None and child.tag == '-text':
+        # Most cells are a single text node
+        return ' '.join(child.text(deep=False).split())
+    items = []
+    text_items(node, items)
+
+    text = ''
+    pending = 0
+    for item in items:
+        if isinstance(item, int):
+            pending = max(pending, item)
+            continue
+        if pending and text:
+            text += '\n' * pending
+        pending = 0
+        text += item
+    lines = [' '.join(line.split()) for line in text.split('\n')]
+    return '\n'.join(lines).strip('\n')
+
+
+def parse_field_list(items):
+    """Turn label/span list items into a dict keyed by the snake-cased label"""
+    fields = {}
+    for item in items:
+        label = item.css_first('label')
+        span = item.css_first('span')
+        if label is not None and span is not None:
+            fields[node_text(label).lower().replace(' ', '_')] = node_text(span)
+    return fields
+
+
+def parse_list_rows(tree):
+    """Parse the rows of a results page (selectolax tree) into the same dicts as LIST_ROWS_JS"""
+    records = []
+    for row in tree.css(LIST_ROW_SELECTOR):
+        if row.css_first(LIST_FIELDS['name']) is None:
+            continue
+        record = {key: node_text(row.css_first(selector)) for key, selector in LIST_FIELDS.items()}
+        for key, (selector, attribute) in LIST_ATTRIBUTES.items():
+            node = row.css_first(selector)
+            record[key] = node.attributes.get(attribute) if node is not None else None
+        records.append(record)
+    return records
+
+
+def parse_detail_page(tree):
+    """Parse a detail page (selectolax tree) into the same dict as DETAIL_PAGE_JS"""
+    demographics = parse_field_list(tree.css(DETAIL_FIELDS['demographics']))
+    bookings = []
+    for section in tree.css(DETAIL_FIELDS['bookings']):
+        booking = {}
+        header = section.css_first(DETAIL_FIELDS['booking_number'])
+        if header is not None:
+            booking['booking_number'] = node_text(header)
+        booking.update(parse_field_list(section.css(DETAIL_FIELDS['booking_fields'])))
+        charges = []
+        for row in section.css(DETAIL_FIELDS['charge_rows']):
+            cells = row.css('td')
+            if len(cells) < len(CHARGE_COLUMNS):
+                continue
+            charges.append({column: node_text(cells[i]) for i, column in enumerate(CHARGE_COLUMNS)})
+        booking['charges'] = charges
+        bookings.append(booking)
+    return {'demographics': demographics, 'bookings': bookings}
@@ -0,0 +1,180 @@
+"""Record and replay NewWorld inmate pages for offline testing and benchmarking.
+
+Recording: run the scraper with `--backend http --record fixtures/` and every
+response is written to the directory along with a manifest.json mapping
+"METHOD /path?query" to the saved file.
+
+Replay: `python fixture_server.py fixtures/` serves those pages locally, so
+either backend can be pointed at it with `--base-url`. `--compare` scrapes
+the replayed pages with both backends and reports any differences.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+
+
+def fixture_key(method, url):
+    """Manifest key for a request; the host is ignored so fixtures replay on any origin"""
+    parts = urlsplit(url)
+    key = f"{method.upper()} {parts.path or '/'}"
+    if parts.query:
+        key += f"?{parts.query}"
+    return key
+
+
+class FixtureRecorder:
+    """Write fetched pages and their manifest to a fixture directory"""
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = load_manifest(directory)
+
+    def save(self, method, url, body):
+        key = fixture_key(method, url)
+        filename = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.html'
+        with open(os.path.join(self.directory, filename), 'w', encoding='utf-8') as f:
+            f.write(body)
+        self.manifest[key] = filename
+
+    def close(self):
+        with open(os.path.join(self.directory, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        logger.info(f"Recorded {len(self.manifest)} pages to {self.directory}")
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FixtureServer:
+    """Serve recorded pages from a background thread"""
+    def __init__(self, directory, host='127.0.0.1', port=0):
+        self.directory = directory
+        self.manifest = load_manifest(directory)
+        if not self.manifest:
+            raise ValueError(f"No {MANIFEST} found in {directory}")
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def replay(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+
+                filename = server.manifest.get(fixture_key(self.command, self.path))
+                if filename is None:
+                    self.send_error(404, "No recorded fixture for this request")
+                    return
+
+                with open(os.path.join(server.directory, filename), 'rb') as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = replay
+            do_POST = replay
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def origin(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+async def compare_backends(directory, backend_names=('http', 'playwright')):
+    """Scrape the replayed pages with each backend and report timing and differences"""
+    from backends import create_backend
+    from scraper import BASE_URL, FlaglerInmateScraper
+
+    results = {}
+    with FixtureServer(directory) as server:
+        base_url = server.origin + urlsplit(BASE_URL).path
+        for name in backend_names:
+            scraper = FlaglerInmateScraper(base_url=base_url, db_path=':memory:')
+            backend = create_backend(name)
+            started = time.monotonic()
+            await backend.start()
+            try:
+                records = []
+                failures, _ = await scraper.scrape(backend, records.extend, rate=0, incremental=False,
+                                                    retry_failed=False)
+            finally:
+                await backend.close()
+            elapsed = time.monotonic() - started
+            results[name] = records
+            logger.info(f"{name}: {len(records)} records, {len(failures)} failures in {elapsed:.2f}s")
+
+    baseline_name, *others = backend_names
+    identical = True
+    for name in others:
+        if results[name] != results[baseline_name]:
+            identical = False
+            logger.error(f"{name} records differ from {baseline_name}")
+            for left, right in zip(results[baseline_name], results[name]):
+                if left != right:
+                    logger.error(f"First difference: {json.dumps(left)} != {json.dumps(right)}")
+                    break
+    if identical:
+        logger.info("All backends produced identical records")
+    return identical
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Replay recorded NewWorld inmate pages")
+    parser.add_argument('directory', help="Fixture directory containing manifest.json")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--compare', action='store_true', help="Scrape the fixtures with both backends and compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        raise SystemExit(0 if asyncio.run(compare_backends(args.directory)) else 1)
+
+    server = FixtureServer(args.directory, args.host, args.port)
+    logger.info(f"Replaying {len(server.manifest)} pages on {server.origin}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
@@ -0,0 +1,221 @@
+"""Pre-render the site to static HTML so pages can be served as plain files.
+
+Listing pages, the common filter listings (custody, race, sex, crime class),
+the stats dashboard and every /inmate/<id> page are rendered through the app's
+own templates and query functions, at the same URLs the app serves them on
+(each as <path>/index.html). The pages are rendered with static_site set, so
+their search form is answered in the browser from search-index.json, which
+holds every inmate in a compact form, and their download links point at the
+full exports inmates.csv.gz and inmates.ndjson.gz written alongside.
+
+Rebuilds are incremental: a manifest records the content hash each detail page
+was rendered from, so only inmates touched since the last build are rendered
+again and pages of inmates that are gone are removed. Listings, the search
+index and the exports are rebuilt whenever the data generation changes. A
+change to the templates forces a full rebuild. Run it from the app directory
+after every scrape or delta apply:
+
+    python prerender.py --output site
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+
+from flask import render_template
+from werkzeug.datastructures import MultiDict
+
+from app import (CHARGE_FIELDS, FILTER_FIELDS, INMATE_FIELDS, STATS_DIMENSIONS, app, cached_facets,
+                 data_generation, db, export_batches, listing_context, load_inmates, load_stats, text)
+from exports import export_chunks, export_filename
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = '.prerender.json'
+SEARCH_INDEX = 'search-index.json'
+SEARCH_FIELDS = ['id', 'last_name', 'first_name', 'middle_name', 'suffix', 'booking_num', 'booking_date',
+                 'booking_at', 'release_date', 'released_at', 'race', 'sex', 'in_custody', 'charges',
+                 'crime_classes', 'agencies']
+# Formats of the full exports linked from static listings
+STATIC_EXPORTS = ['csv', 'ndjson']
+DETAIL_BATCH = 500
+
+
+def slug(value):
+    return re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-')
+
+
+def write_page(output_dir, url_path, html):
+    """Write a page where a static server finds it for url_path, replacing it atomically"""
+    directory = os.path.join(output_dir, url_path.strip('/'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'index.html')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(path + '.tmp', path)
+
+
+def template_fingerprint():
+    """Hash of every template, so a template change forces a full rebuild"""
+    digest = hashlib.sha1()
+    folder = os.path.join(app.root_path, app.template_folder)
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.html'):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(folder, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def common_listings():
+    """(URL path, filters) for the unfiltered listing and the common filter listings"""
+    listings = [('/', {}), ('/custody/in/', {'custody': 'in'}), ('/custody/released/', {'custody': 'released'})]
+    stats = load_stats()
+    for dimension, field in (('race', 'search_race'), ('sex', 'search_gender')):
+        for row in stats[dimension]:
+            if row['value']:
+                listings.append((f"/{dimension}/{slug(row['value'])}/", {field: row['value']}))
+    for row in cached_facets({field: '' for field in FILTER_FIELDS})['crime_class']:
+        if slug(row['value']):
+            listings.append((f"/crime-class/{slug(row['value'])}/", {'crime_class': row['value']}))
+    return listings
+
+
+def render_listing(output_dir, base_path, filters, max_pages):
+    """Render the first max_pages pages of one listing by walking its keyset cursors"""
+    def page_path(page):
+        return base_path if page == 1 else f"{base_path}page/{page}/"
+
+    args = dict(filters)
+    pages = 0
+    while pages < max_pages:
+        context = listing_context(MultiDict(args))
+        pages += 1
+        page = context['page']
+        has_next = context['has_next'] and page < max_pages
+        context.update({
+            'first_url': base_path,
+            'prev_url': page_path(page - 1),
+            'next_url': page_path(page + 1),
+            'has_next': has_next,
+            'total_pages': min(context['total_pages'], max_pages),
+        })
+        write_page(output_dir, page_path(page), render_template('index.html', static_site=True, **context))
+        if not has_next:
+            break
+        args = {**filters, 'after': context['next_cursor'], 'page': page + 1}
+
+    # Pages left over from a longer listing in an earlier build
+    pages_dir = os.path.join(output_dir, base_path.strip('/'), 'page')
+    if os.path.isdir(pages_dir):
+        for name in os.listdir(pages_dir):
+            if name.isdigit() and int(name) > pages:
+                shutil.rmtree(os.path.join(pages_dir, name))
+    return pages
+
+
+def write_search_index(output_dir, generation):
+    """Every inmate with its own booking's charge descriptions, crime classes and
+    arresting agencies, as compact JSON rows for the static search form"""
+    rows = db.session.execute(text('''
+        SELECT i.id, i.last_name, i.first_name, i.middle_name, i.suffix, i.booking_num, i.booking_date,
+               i.booking_at, i.release_date, i.released_at, i.race, i.sex, i.in_custody,
+               (SELECT json_group_array(DISTINCT c.charge_description)
+                FROM charges c JOIN bookings b ON b.id = c.booking_id AND b.position = 0
+                WHERE c.inmate_row_id = i.id) AS charges,
+               (SELECT json_group_array(f.value) FROM inmate_facets f
+                WHERE f.inmate_row_id = i.id AND f.facet = 'crime_class') AS crime_classes,
+               (SELECT json_group_array(f.value) FROM inmate_facets f
+                WHERE f.inmate_row_id = i.id AND f.facet = 'arresting_agency') AS agencies
+        FROM inmates i ORDER BY i.booking_at DESC, i.id DESC
+    '''))
+    index = {
+        'generation': generation,
+        'fields': SEARCH_FIELDS,
+        'rows': [[*row[:-3], *(json.loads(values) for values in row[-3:])] for row in rows],
+    }
+    path = os.path.join(output_dir, SEARCH_INDEX)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+    return len(index['rows'])
+
+
+def write_exports(output_dir):
+    """Gzipped full exports, the static stand-in for the app's /export links"""
+    for export_format in STATIC_EXPORTS:
+        path = os.path.join(output_dir, export_filename(export_format, compress=True))
+        chunks = export_chunks(export_batches({}), export_format, INMATE_FIELDS, CHARGE_FIELDS, compress=True)
+        with open(path + '.tmp', 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(path + '.tmp', path)
+
+
+def prerender(output_dir='site', full=False, max_pages=20):
+    """Bring the static site in output_dir up to date; returns the number of pages written"""
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not full:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    with app.app_context():
+        db.engine.echo = False
+        generation = data_generation()
+        templates = template_fingerprint()
+        if manifest.get('templates') != templates:
+            manifest = {}
+        rendered = manifest.get('inmates', {})
+
+        current = {str(inmate_id): content_hash for inmate_id, content_hash in
+                   db.session.execute(text('SELECT id, content_hash FROM inmates'))}
+        # Rows without a content hash (migrated, not yet rescraped) are always rendered
+        changed = [int(inmate_id) for inmate_id, content_hash in current.items()
+                   if content_hash is None or rendered.get(inmate_id) != content_hash]
+        removed = [inmate_id for inmate_id in rendered if inmate_id not in current]
+        logger.info(f"Generation {generation}: {len(changed)} inmate pages to render, {len(removed)} to remove")
+
+        written = 0
+        for start in range(0, len(changed), DETAIL_BATCH):
+            for inmate_id, inmate in load_inmates(changed[start:start + DETAIL_BATCH]).items():
+                write_page(output_dir, f"/inmate/{inmate_id}/", render_template('inmate_detail.html', inmate=inmate))
+                written += 1
+        for inmate_id in removed:
+            shutil.rmtree(os.path.join(output_dir, 'inmate', inmate_id), ignore_errors=True)
+
+        if manifest.get('generation') != generation or changed or removed:
+            for base_path, filters in common_listings():
+                written += render_listing(output_dir, base_path, filters, max_pages)
+            stats_data = load_stats()
+            busiest = max((day['count'] for day in stats_data['bookings_per_day']), default=0)
+            write_page(output_dir, '/stats/', render_template('stats.html', stats=stats_data, static_site=True,
+                                                              dimensions=STATS_DIMENSIONS, busiest=busiest))
+            written += 1
+            indexed = write_search_index(output_dir, generation)
+            logger.info(f"Search index: {indexed} inmates")
+            write_exports(output_dir)
+
+    manifest = {'generation': generation, 'templates': templates, 'inmates': current}
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(manifest_path + '.tmp', manifest_path)
+    logger.info(f"Wrote {written} pages to {output_dir}")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the inmate site to static HTML")
+    parser.add_argument('--output', default='site', help="Directory to write the static site to")
+    parser.add_argument('--full', action='store_true', help="Render every page, not only what changed")
+    parser.add_argument('--max-pages', type=int, default=20, help="Pages rendered for each listing")
+    parser.add_argument('--templates', help="Template directory (default: the app's)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO)
+    if args.templates:
+        app.template_folder = os.path.abspath(args.templates)
+    prerender(args.output, full=args.full, max_pages=args.max_pages)
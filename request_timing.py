@@ -0,0 +1,115 @@
+"""Per-request timing for the web app.
+
+Every request records its total time, the time spent running SQL and the time
+spent rendering templates, in per-endpoint latency histograms. The same numbers
+go back to the client in a Server-Timing header, and the app serves the
+histograms on /metrics. Counters are kept per process, so behind Passenger each
+worker reports its own.
+"""
+import threading
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from run_metrics import Histogram
+
+# Upper bounds in seconds; web requests are mostly well under the scraper's smallest bucket
+WEB_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+
+PHASES = ['request', 'query', 'render']
+
+
+class RequestTimer:
+    """Collects request, query and render time per endpoint"""
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.responses = {}
+        self.started_at = time.time()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        before_render_template.connect(self.start_render, app)
+        template_rendered.connect(self.finish_render, app)
+        event.listen(Engine, 'before_cursor_execute', self.start_query)
+        event.listen(Engine, 'after_cursor_execute', self.finish_query)
+
+    def start_request(self):
+        g.timing = {'started': time.perf_counter(), 'query': 0.0, 'queries': 0, 'render': 0.0}
+
+    def start_query(self, *args):
+        if has_request_context() and 'timing' in g:
+            g.timing['query_started'] = time.perf_counter()
+
+    def finish_query(self, *args):
+        if has_request_context() and 'query_started' in g.get('timing', {}):
+            g.timing['query'] += time.perf_counter() - g.timing.pop('query_started')
+            g.timing['queries'] += 1
+
+    def start_render(self, sender, template, context, **extra):
+        if 'timing' in g:
+            g.timing['render_started'] = time.perf_counter()
+
+    def finish_render(self, sender, template, context, **extra):
+        if 'render_started' in g.get('timing', {}):
+            g.timing['render'] += time.perf_counter() - g.timing.pop('render_started')
+
+    def finish_request(self, response):
+        timing = g.get('timing')
+        if timing is None:
+            return response
+
+        timing['request'] = time.perf_counter() - timing['started']
+        endpoint = request.endpoint or 'not_found'
+        with self.lock:
+            for phase in PHASES:
+                key = (endpoint, phase)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(WEB_BUCKETS)
+                self.histograms[key].observe(timing[phase])
+            key = (endpoint, response.status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+        response.headers['Server-Timing'] = (
+            f"db;desc=\"{timing['queries']} queries\";dur={timing['query'] * 1000:.2f}, "
+            f"render;dur={timing['render'] * 1000:.2f}, total;dur={timing['request'] * 1000:.2f}"
+        )
+        return response
+
+    def report(self):
+        """Latency summary per endpoint and phase, plus response counts"""
+        with self.lock:
+            endpoints = {}
+            for (endpoint, phase), histogram in sorted(self.histograms.items()):
+                summary = histogram.to_dict()
+                summary.pop('buckets')
+                endpoints.setdefault(endpoint, {})[phase] = summary
+            responses = {f'{endpoint} {status}': count for (endpoint, status), count in sorted(self.responses.items())}
+        return {
+            'process_started_at': self.started_at,
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'endpoints': endpoints,
+            'responses': responses,
+        }
+
+    def to_prometheus(self, prefix='flagler_web'):
+        """Render the histograms and response counts in the Prometheus text exposition format"""
+        lines = [
+            f'# TYPE {prefix}_process_start_time_seconds gauge',
+            f'{prefix}_process_start_time_seconds {self.started_at:.0f}',
+            f'# TYPE {prefix}_responses_total counter',
+        ]
+        with self.lock:
+            for (endpoint, status), count in sorted(self.responses.items()):
+                lines.append(f'{prefix}_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            for phase in PHASES:
+                lines.append(f'# TYPE {prefix}_{phase}_seconds histogram')
+                for (endpoint, histogram_phase), histogram in sorted(self.histograms.items()):
+                    if histogram_phase == phase:
+                        lines.extend(histogram.to_prometheus(f'{prefix}_{phase}_seconds', f'endpoint="{endpoint}"'))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,127 @@
+"""Rendered-response cache for the Flask app, keyed on the scrape generation.
+
+The scraper bumps a generation number every time it writes new data and
+mirrors it into a small stamp file next to the database. Reading that file
+is a stat() call, so a cached page can be served (or answered with 304)
+without opening SQLite at all.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+
+class GenerationStamp:
+    """Reads the scraper's generation stamp file, re-parsing it only when it changes"""
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.value = (None, None)
+
+    def read(self):
+        """Return (generation, updated_at) or (None, None) when there is no stamp yet"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None, None
+
+        if mtime != self.mtime:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    stamp = json.load(f)
+                updated_at = datetime.fromisoformat(stamp['updated_at'])
+                if updated_at.tzinfo is None:
+                    updated_at = updated_at.replace(tzinfo=timezone.utc)
+                self.value = (str(stamp['generation']), updated_at.replace(microsecond=0))
+            except (OSError, ValueError, KeyError):
+                self.value = (None, None)
+            self.mtime = mtime
+        return self.value
+
+
+class ResponseCache:
+    """Bounded in-memory LRU with an optional on-disk store shared between processes"""
+    def __init__(self, max_entries=512, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.disk_generation = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(generation, path, args):
+        """Cache key for a route and its (multi-valued) query parameters"""
+        query = urlencode(sorted(args))
+        return f'{generation}|{path}?{query}'
+
+    @staticmethod
+    def etag(key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def disk_path(self, key):
+        generation = key.split('|', 1)[0]
+        return os.path.join(self.directory, f'{generation}-{self.etag(key)}.cache')
+
+    def get(self, key):
+        """Return a cached {'status', 'mimetype', 'body'} entry, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+
+        if not self.directory:
+            return None
+        try:
+            with open(self.disk_path(key), 'rb') as f:
+                header, body = f.read().split(b'\n', 1)
+        except (OSError, ValueError):
+            return None
+
+        entry = {**json.loads(header), 'body': body}
+        self.remember(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        self.remember(key, entry)
+        if not self.directory:
+            return
+
+        self.prune_disk(key.split('|', 1)[0])
+        header = json.dumps({'status': entry['status'], 'mimetype': entry['mimetype']}).encode('utf-8')
+        # Write-then-rename so other workers never read a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header + b'\n' + entry['body'])
+            os.replace(tmp_path, self.disk_path(key))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def remember(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def prune_disk(self, generation):
+        """Delete on-disk entries from older generations, once per generation change"""
+        if self.disk_generation == generation:
+            return
+        self.disk_generation = generation
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache') and not name.startswith(f'{generation}-'):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,150 @@
+"""Timers, counters and latency histograms for one scraper run.
+
+Phases accumulate wall time (concurrent workers add up, so detail phases can
+exceed the run's duration). The finished report is plain JSON and can also be
+rendered in the Prometheus text exposition format for a node_exporter textfile
+collector.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Upper bounds in seconds, shared by every latency histogram
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None above the last bucket)"""
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return None
+
+    def to_prometheus(self, name, labels=''):
+        """Exposition lines for this histogram as the metric `name` with extra labels"""
+        lines = []
+        cumulative = 0
+        for bound, count in zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts):
+            cumulative += count
+            bucket_labels = ','.join(filter(None, [labels, f'le="{bound}"']))
+            lines.append(f'{name}_bucket{{{bucket_labels}}} {cumulative}')
+        braces = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{braces} {self.sum:.4f}')
+        lines.append(f'{name}_count{braces} {self.count}')
+        return lines
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+class RunMetrics:
+    """Metrics collected over one run; `report()` returns them as a dict"""
+    def __init__(self, **labels):
+        self.labels = labels
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.monotonic()
+        self.finished_at = None
+        self.duration = None
+        self.phases = {}
+        self.counters = {}
+        self.histograms = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Add the wall time of the enclosed block to a phase"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.monotonic() - started)
+
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def inc(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].observe(value)
+
+    def finish(self):
+        self.finished_at = datetime.now(timezone.utc)
+        self.duration = time.monotonic() - self.started
+
+    def report(self):
+        if self.finished_at is None:
+            self.finish()
+        return {
+            **self.labels,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': self.finished_at.isoformat(timespec='seconds'),
+            'duration_seconds': round(self.duration, 3),
+            'phases': {name: round(seconds, 4) for name, seconds in sorted(self.phases.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'histograms': {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def to_prometheus(self, prefix='flagler_scraper'):
+        """Render the finished run in the Prometheus text exposition format"""
+        report = self.report()
+        labels = ','.join(f'{key}="{value}"' for key, value in sorted(self.labels.items()))
+        braces = f'{{{labels}}}' if labels else ''
+
+        lines = [
+            f'# TYPE {prefix}_run_duration_seconds gauge',
+            f'{prefix}_run_duration_seconds{braces} {report["duration_seconds"]}',
+            f'# TYPE {prefix}_run_finished_timestamp_seconds gauge',
+            f'{prefix}_run_finished_timestamp_seconds{braces} {self.finished_at.timestamp():.0f}',
+            f'# TYPE {prefix}_phase_seconds gauge',
+        ]
+        for name, seconds in report['phases'].items():
+            phase_labels = ','.join(filter(None, [labels, f'phase="{name}"']))
+            lines.append(f'{prefix}_phase_seconds{{{phase_labels}}} {seconds}')
+        for name, value in report['counters'].items():
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name}{braces} {value}')
+        for name, histogram in self.histograms.items():
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            lines.extend(histogram.to_prometheus(f'{prefix}_{name}', labels))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path=None, prometheus_path=None):
+        """Write the JSON report and/or Prometheus textfile atomically"""
+        for path, content in ((json_path, lambda: json.dumps(self.report(), indent=2)),
+                              (prometheus_path, self.to_prometheus)):
+            if not path:
+                continue
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content())
+            os.replace(tmp_path, path)
@@ -1,24 +1,111 @@
+import argparse
 import asyncio
+import hashlib
 import json
 import sqlite3
 import logging
-from datetime import datetime, timedelta
-from playwright.async_api import async_playwright
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin
+from backends import BACKENDS, DEFAULT_ASSET_CACHE, DEFAULT_PROFILE, create_backend
+from deltas import DeltaWriter
+from extraction import CHARGE_COLUMNS
+from run_metrics import RunMetrics
+from throttling import CircuitBreaker, RateLimiter, backoff_delay
 import re
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+BASE_URL = "https://nwwebcad.fcpsn.org/NewWorld.InmateInquiry/FL0180000"
+
+# List-row columns that identify a booking in the search results; detail_link is left
+# out because it is a navigation detail, not content
+LIST_FINGERPRINT_FIELDS = ['subject_number', 'name', 'race', 'gender', 'dob', 'height', 'weight']
+
+# Columns written by save_to_database, in table order
+INMATE_COLUMNS = [
+    'booking_num', 'inmate_id', 'last_name', 'first_name', 'middle_name', 'suffix',
+    'sex', 'race', 'booking_date', 'release_date', 'booking_at', 'released_at', 'in_custody',
+    'photo_link', 'charge_count'
+]
+
+# Columns of scrape_state, in the order save_batch writes them
+STATE_COLUMNS = ['subject_number', 'name', 'list_fingerprint', 'detail_fingerprint', 'in_custody', 'last_scraped',
+                 'booking_at']
+
+# Dimensions counted in inmate_stats, as SQL over an inmates row or a charges row
+INMATE_STATS = {
+    'total': "''",
+    'race': "COALESCE({row}.race, '')",
+    'sex': "COALESCE({row}.sex, '')",
+    'custody': "COALESCE({row}.in_custody, '')",
+    'booking_day': "COALESCE(substr({row}.booking_at, 1, 10), '')",
+}
+CHARGE_STATS = {
+    'crime_class': "COALESCE(trim({row}.crime_class), '')",
+    'arresting_agency': "COALESCE(trim({row}.arresting_agencies), '')",
+}
+
+# True for a charges row on its inmates row's own (most recent) booking
+OWN_BOOKING = "(SELECT position FROM bookings WHERE id = {row}.booking_id) = 0"
+
+# Runs a detail page may fail in a row before it is dropped from the retry queue
+MAX_RETRY_RUNS = 5
+
+# Start of the wal-index header in the -shm file (https://sqlite.org/walformat.html):
+# page size, frames in the WAL, and the salt that changes whenever the WAL restarts
+WAL_INDEX_HEADER = struct.Struct('=14xHI12x8s')
+
+# Date formats shown on the county site, most specific first
+SITE_DATETIME_FORMATS = [
+    '%m/%d/%Y %I:%M:%S %p',
+    '%m/%d/%Y %I:%M %p',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+]
+
+def to_iso_datetime(value):
+    """Parse a site date/time string into sortable ISO-8601, or '' if it is blank or unrecognised"""
+    value = ' '.join((value or '').split())
+    for date_format in SITE_DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).isoformat()
+        except ValueError:
+            continue
+    return ''
+
+def fingerprint(data):
+    """Stable content hash of a JSON-serialisable value"""
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
 class FlaglerInmateScraper:
-    def __init__(self):
-        self.base_url = "https://nwwebcad.fcpsn.org/NewWorld.InmateInquiry/FL0180000"
-        self.db_path = "volusia_inmates.db"
+    def __init__(self, base_url=BASE_URL, db_path="volusia_inmates.db"):
+        self.base_url = base_url
+        self.db_path = db_path
+        self.metrics = RunMetrics()
+        # DeltaWriter collecting this run's changes, if deltas are being recorded
+        self.changes = None
         self.setup_database()
     
+    def connect(self):
+        """Open a connection tuned for bulk writes"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA cache_size = -20000')  # ~20 MB
+        return conn
+    
     def setup_database(self):
         """Create the database and table if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.connect()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -40,10 +127,429 @@ class FlaglerInmateScraper:
             )
         ''')
         
+        # Columns added after the original schema
+        self.add_columns(cursor, 'inmates', {
+            'content_hash': 'TEXT',
+            'charge_count': 'INTEGER NOT NULL DEFAULT 0',
+            'booking_at': 'TEXT',
+            'released_at': 'TEXT',
+        })
+        
+        # Booking history and charges, one row each, keyed to the inmates row they belong to
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bookings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                inmate_row_id INTEGER NOT NULL REFERENCES inmates(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                booking_num TEXT,
+                booking_date TEXT,
+                release_date TEXT,
+                booking_at TEXT,
+                released_at TEXT
+            )
+        ''')
+        self.add_columns(cursor, 'bookings', {'booking_at': 'TEXT', 'released_at': 'TEXT'})
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_inmate ON bookings (inmate_row_id, position)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_booking_num ON bookings (booking_num)')
+        
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS charges (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                inmate_row_id INTEGER NOT NULL REFERENCES inmates(id) ON DELETE CASCADE,
+                booking_id INTEGER REFERENCES bookings(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                {', '.join(f'{column} TEXT' for column in CHARGE_COLUMNS)}
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_charges_inmate ON charges (inmate_row_id, booking_id, position)')
+        
+        self.migrate_charges_json(cursor)
+        self.migrate_timestamps(cursor)
+        self.setup_search_index(cursor)
+        self.setup_charge_index(cursor)
+        self.setup_stats(cursor)
+        
+        # Bumped whenever a run changes data, so readers can tell when caches go stale
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO scrape_meta (key, value) VALUES ('generation', '1')")
+        if not os.path.exists(self.generation_stamp_path()):
+            self.write_generation_stamp(cursor)
+        
+        # What the last detail scrape saw for each subject, used by incremental runs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_state (
+                subject_number TEXT PRIMARY KEY,
+                name TEXT,
+                list_fingerprint TEXT,
+                detail_fingerprint TEXT,
+                in_custody TEXT,
+                last_scraped TEXT
+            )
+        ''')
+        self.add_columns(cursor, 'scrape_state', {'booking_at': 'TEXT'})
+        
+        # Detail pages that failed every attempt, retried first on the next run
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS retry_queue (
+                detail_link TEXT PRIMARY KEY,
+                inmate TEXT NOT NULL,
+                runs_failed INTEGER DEFAULT 1,
+                last_error TEXT,
+                last_failed TEXT
+            )
+        ''')
+        
+        # One row per run, with the full metrics report as JSON
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scrape_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT,
+                finished_at TEXT,
+                duration_seconds REAL,
+                backend TEXT,
+                inserted INTEGER,
+                updated INTEGER,
+                unchanged INTEGER,
+                errors INTEGER,
+                detail_requests INTEGER,
+                failures INTEGER,
+                report TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_runs_started_at ON scrape_runs (started_at)')
+        
+        # Backfill checkpoints: one row per date shard that has been merged
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backfill_shards (
+                shard_from TEXT NOT NULL,
+                shard_to TEXT NOT NULL,
+                status TEXT NOT NULL,
+                records INTEGER DEFAULT 0,
+                failures INTEGER DEFAULT 0,
+                error TEXT,
+                finished_at TEXT,
+                PRIMARY KEY (shard_from, shard_to)
+            )
+        ''')
+        
         conn.commit()
         conn.close()
         logger.info("Database setup complete")
     
+    def setup_search_index(self, cursor):
+        """Full-text name index and the filter indexes used by the listing
+        
+        inmate_names is an external-content FTS5 table over inmates; triggers keep it
+        in sync with every insert, update and delete made by save_to_database.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inmate_names'")
+        needs_rebuild = cursor.fetchone() is None
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS inmate_names USING fts5(
+                last_name, first_name, middle_name,
+                content='inmates', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        # Distinct name tokens, used for typo-tolerant lookups
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS inmate_name_terms USING fts5vocab(inmate_names, 'row')")
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS inmates_names_insert AFTER INSERT ON inmates BEGIN
+                INSERT INTO inmate_names (rowid, last_name, first_name, middle_name)
+                VALUES (new.id, new.last_name, new.first_name, new.middle_name);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS inmates_names_delete AFTER DELETE ON inmates BEGIN
+                INSERT INTO inmate_names (inmate_names, rowid, last_name, first_name, middle_name)
+                VALUES ('delete', old.id, old.last_name, old.first_name, old.middle_name);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS inmates_names_update
+            AFTER UPDATE OF last_name, first_name, middle_name ON inmates BEGIN
+                INSERT INTO inmate_names (inmate_names, rowid, last_name, first_name, middle_name)
+                VALUES ('delete', old.id, old.last_name, old.first_name, old.middle_name);
+                INSERT INTO inmate_names (rowid, last_name, first_name, middle_name)
+                VALUES (new.id, new.last_name, new.first_name, new.middle_name);
+            END
+        ''')
+        
+        if needs_rebuild:
+            logger.info("Building full-text name index")
+            cursor.execute("INSERT INTO inmate_names (inmate_names) VALUES ('rebuild')")
+        
+        # The listing sorts and range-filters on the ISO timestamps; exact-match
+        # race/sex and custody filters lead so they narrow the same scan
+        cursor.execute('DROP INDEX IF EXISTS idx_inmates_race_sex_booking')
+        cursor.execute('DROP INDEX IF EXISTS idx_inmates_sex_booking')
+        cursor.execute('DROP INDEX IF EXISTS idx_inmates_booking_date')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_inmates_race_sex_booking_at
+            ON inmates (race COLLATE NOCASE, sex COLLATE NOCASE, booking_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_inmates_sex_booking_at
+            ON inmates (sex COLLATE NOCASE, booking_at)
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_inmates_custody_booking_at ON inmates (in_custody, booking_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_inmates_booking_at ON inmates (booking_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_inmates_released_at ON inmates (released_at)')
+    
+    def setup_charge_index(self, cursor):
+        """Full-text index over charge descriptions and posting lists for the charge facets
+        
+        charge_text is an external-content FTS5 table over charges. inmate_facets
+        lists, for every crime class and arresting agency value, the inmates rows
+        with a charge on their own booking carrying it, with the number of such
+        charges. Triggers keep both in step with write_bookings.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inmate_facets'")
+        needs_rebuild = cursor.fetchone() is None
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS charge_text USING fts5(
+                charge_description,
+                content='charges', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS charges_text_insert AFTER INSERT ON charges BEGIN
+                INSERT INTO charge_text (rowid, charge_description) VALUES (new.id, new.charge_description);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS charges_text_delete AFTER DELETE ON charges BEGIN
+                INSERT INTO charge_text (charge_text, rowid, charge_description)
+                VALUES ('delete', old.id, old.charge_description);
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS inmate_facets (
+                facet TEXT NOT NULL,
+                value TEXT NOT NULL,
+                inmate_row_id INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (facet, value, inmate_row_id)
+            ) WITHOUT ROWID
+        ''')
+        # Facet counts under other filters look up each matching row's values
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_inmate_facets_row ON inmate_facets (inmate_row_id, facet, value)')
+        values = ', '.join(f"('{facet}', {expr.format(row='new')}, new.inmate_row_id, 1)"
+                           for facet, expr in CHARGE_STATS.items())
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS charges_facets_insert AFTER INSERT ON charges
+            WHEN {OWN_BOOKING.format(row='new')} BEGIN
+                INSERT INTO inmate_facets (facet, value, inmate_row_id, count) VALUES {values}
+                ON CONFLICT(facet, value, inmate_row_id) DO UPDATE SET count = count + 1;
+            END
+        ''')
+        # Drop a posting once the last charge carrying its value is gone
+        matches = [f"facet = '{facet}' AND value = {expr.format(row='old')} AND inmate_row_id = old.inmate_row_id"
+                   for facet, expr in CHARGE_STATS.items()]
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS charges_facets_delete AFTER DELETE ON charges
+            WHEN {OWN_BOOKING.format(row='old')} BEGIN
+                {' '.join(f'UPDATE inmate_facets SET count = count - 1 WHERE {match};' for match in matches)}
+                {' '.join(f'DELETE FROM inmate_facets WHERE {match} AND count <= 0;' for match in matches)}
+            END
+        ''')
+        
+        if needs_rebuild:
+            logger.info("Building charge search index")
+            cursor.execute("INSERT INTO charge_text (charge_text) VALUES ('rebuild')")
+            for facet, expr in CHARGE_STATS.items():
+                cursor.execute(f'''
+                    INSERT INTO inmate_facets (facet, value, inmate_row_id, count)
+                    SELECT '{facet}', {expr.format(row='charges')}, charges.inmate_row_id, COUNT(*)
+                    FROM charges JOIN bookings ON bookings.id = charges.booking_id AND bookings.position = 0
+                    GROUP BY 2, 3
+                ''')
+    
+    def setup_stats(self, cursor):
+        """Aggregate counts for /stats, kept current by triggers on every write
+        
+        inmate_stats holds one count per (dimension, value): the race, sex, custody
+        status and booking day of each inmates row, and the crime class and
+        arresting agency of the charges on each row's own (most recent) booking.
+        Older bookings are left out because they also appear as rows of their own.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inmate_stats'")
+        needs_rebuild = cursor.fetchone() is None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS inmate_stats (
+                dimension TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, value)
+            ) WITHOUT ROWID
+        ''')
+        
+        def increment(stats, row):
+            values = ', '.join(f"('{dimension}', {expr.format(row=row)}, 1)" for dimension, expr in stats.items())
+            return f'''
+                INSERT INTO inmate_stats (dimension, value, count) VALUES {values}
+                ON CONFLICT(dimension, value) DO UPDATE SET count = count + 1;
+            '''
+        
+        def decrement(stats, row):
+            return '\n'.join(
+                f"UPDATE inmate_stats SET count = count - 1 WHERE dimension = '{dimension}' AND value = {expr.format(row=row)};"
+                for dimension, expr in stats.items()
+            )
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS inmates_stats_insert AFTER INSERT ON inmates BEGIN
+                {increment(INMATE_STATS, 'new')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS inmates_stats_delete AFTER DELETE ON inmates BEGIN
+                {decrement(INMATE_STATS, 'old')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS inmates_stats_update
+            AFTER UPDATE OF race, sex, in_custody, booking_at ON inmates BEGIN
+                {decrement(INMATE_STATS, 'old')}
+                {increment(INMATE_STATS, 'new')}
+            END
+        ''')
+        # write_bookings deletes charges before their bookings and inserts them after,
+        # so the booking's position is always there to check
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS charges_stats_insert AFTER INSERT ON charges
+            WHEN {OWN_BOOKING.format(row='new')} BEGIN
+                {increment(CHARGE_STATS, 'new')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS charges_stats_delete AFTER DELETE ON charges
+            WHEN {OWN_BOOKING.format(row='old')} BEGIN
+                {decrement(CHARGE_STATS, 'old')}
+            END
+        ''')
+        
+        if needs_rebuild:
+            self.rebuild_stats(cursor)
+    
+    def rebuild_stats(self, cursor):
+        """Recount inmate_stats from scratch"""
+        logger.info("Building statistics tables")
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('DELETE FROM inmate_stats')
+        for dimension, expr in INMATE_STATS.items():
+            cursor.execute(f'''
+                INSERT INTO inmate_stats (dimension, value, count)
+                SELECT '{dimension}', {expr.format(row='inmates')}, COUNT(*) FROM inmates GROUP BY 2
+            ''')
+        for dimension, expr in CHARGE_STATS.items():
+            cursor.execute(f'''
+                INSERT INTO inmate_stats (dimension, value, count)
+                SELECT '{dimension}', {expr.format(row='charges')}, COUNT(*)
+                FROM charges JOIN bookings ON bookings.id = charges.booking_id AND bookings.position = 0
+                GROUP BY 2
+            ''')
+        cursor.execute('COMMIT')
+    
+    def generation_stamp_path(self):
+        return f"{self.db_path}.generation"
+    
+    def generation(self, cursor):
+        cursor.execute("SELECT value FROM scrape_meta WHERE key = 'generation'")
+        return int(cursor.fetchone()[0])
+    
+    def write_generation_stamp(self, cursor):
+        """Mirror the data generation into a file the web app can check without opening SQLite"""
+        if self.db_path == ':memory:':
+            return
+        
+        stamp = {
+            'generation': self.generation(cursor),
+            'updated_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        }
+        tmp_path = self.generation_stamp_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stamp, f)
+        os.replace(tmp_path, self.generation_stamp_path())
+    
+    def add_columns(self, cursor, table, columns):
+        """Add any of the given {name: definition} columns missing from an existing table"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing_columns:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+    
+    def migrate_timestamps(self, cursor):
+        """Backfill booking_at/released_at from the display date strings"""
+        for table in ('inmates', 'bookings'):
+            rows = cursor.execute(f'''
+                SELECT id, booking_date, release_date FROM {table}
+                WHERE booking_at IS NULL OR released_at IS NULL
+            ''').fetchall()
+            if not rows:
+                continue
+            
+            logger.info(f"Backfilling ISO timestamps for {len(rows)} {table} rows")
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany(f'UPDATE {table} SET booking_at = ?, released_at = ? WHERE id = ?', [
+                (to_iso_datetime(booking_date), to_iso_datetime(release_date), row_id)
+                for row_id, booking_date, release_date in rows
+            ])
+            cursor.execute('COMMIT')
+    
+    def migrate_charges_json(self, cursor):
+        """Move charges out of the legacy inmates.charges JSON column into the charges table
+        
+        The JSON blob did not record which booking a charge came from, so migrated
+        charges are attached to a single booking for the row's own booking number.
+        """
+        cursor.execute('SELECT COUNT(*) FROM inmates WHERE charges IS NOT NULL')
+        pending = cursor.fetchone()[0]
+        if not pending:
+            return
+        
+        logger.info(f"Migrating charges JSON for {pending} inmates")
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            rows = cursor.execute('''
+                SELECT id, booking_num, booking_date, release_date, charges
+                FROM inmates WHERE charges IS NOT NULL
+            ''').fetchall()
+            for row_id, booking_num, booking_date, release_date, charges_json in rows:
+                try:
+                    charges = json.loads(charges_json) or []
+                except json.JSONDecodeError as e:
+                    logger.error(f"Invalid JSON in charges for booking_num {booking_num}: {e}")
+                    charges = []
+                
+                booking = {
+                    'booking_num': booking_num,
+                    'booking_date': booking_date,
+                    'release_date': release_date,
+                    'booking_at': to_iso_datetime(booking_date),
+                    'released_at': to_iso_datetime(release_date),
+                    'charges': [{column: charge.get(column, '') for column in CHARGE_COLUMNS} for charge in charges]
+                }
+                self.write_bookings(cursor, {booking_num: row_id}, {booking_num: [booking]})
+                cursor.execute('UPDATE inmates SET charge_count = ?, charges = NULL, content_hash = NULL WHERE id = ?',
+                               (len(charges), row_id))
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+    
     def get_date_range(self, days_back=2):
         """Get date range for scraping (yesterday to today by default)"""
         today = datetime.now()
@@ -72,300 +578,733 @@ class FlaglerInmateScraper:
         else:
             return full_name, "", "", ""
     
-    async def scrape_inmate_list(self, page):
-        """Scrape the main inmate list"""
-        logger.info("Navigating to inmate search page")
-        await page.goto(self.base_url)
-        
-        # Get date range
-        from_date, to_date = self.get_date_range()
+    def booking_status(self, inmate):
+        """Return (booking_date, release_date, in_custody) for the most recent booking"""
+        if not inmate.get('bookings'):
+            return "", "", "No"
         
-        # Fill in the date fields
-        logger.info(f"Setting booking date range: {from_date} to {to_date}")
-        await page.fill('#uxBookingFromDate', from_date)
-        await page.fill('#uxBookingToDate', to_date)
+        latest_booking = inmate['bookings'][0]  # Assuming first is most recent
+        booking_date = latest_booking.get('booking_date', '')
+        release_date = latest_booking.get('release_date', '')
+        in_custody = "Yes" if not release_date else "No"
+        return booking_date, release_date, in_custody
+    
+    def list_fingerprint(self, inmate_data):
+        """Fingerprint of the search-result columns for one inmate"""
+        return fingerprint({field: inmate_data.get(field, '') for field in LIST_FINGERPRINT_FIELDS})
+    
+    def filter_unchanged(self, inmates_list, date_range):
+        """Drop inmates whose detail page cannot have changed since the last scrape
         
-        # Click search with date filters
-        logger.info("Clicking search button with date filters")
-        await page.click('input[type="submit"][value="Search"]')
+        A detail page is only skipped when the subject was released at the last scrape
+        and the booking stored then falls inside the searched (from, to) window, so it
+        is the booking this search found. The list row carries no booking data, so a
+        released subject booked again looks the same there; any subject whose stored
+        booking is outside the window is scraped as possibly booked again.
+        """
+        window_start = to_iso_datetime(date_range[0])
+        window_end = to_iso_datetime(date_range[1])
+        if window_end:
+            window_end = (datetime.fromisoformat(window_end) + timedelta(days=1)).isoformat()
         
-        # Wait for results to load
-        try:
-            await page.wait_for_selector('.Results', timeout=10000)
-        except:
-            logger.error("No results found or page didn't load properly")
-            return []
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
         
-        inmates_data = []
-        current_page = 1
-        max_pages = 3  # Limit to 3 pages
+        to_scrape = []
+        skipped = 0
         
-        while current_page <= max_pages:
-            logger.info(f"Scraping page {current_page}")
+        for inmate in inmates_list:
+            subject_number = inmate.get('subject_number', '')
+            state = None
+            if subject_number:
+                cursor.execute('''
+                    SELECT name, list_fingerprint, in_custody, booking_at
+                    FROM scrape_state WHERE subject_number = ?
+                ''', (subject_number,))
+                state = cursor.fetchone()
             
-            # Check if we have results
+            if (state
+                    and state[0] == inmate['name']
+                    and state[1] == self.list_fingerprint(inmate)
+                    and state[2] == "No"
+                    and window_start and window_end and state[3]
+                    and window_start <= state[3] < window_end):
+                skipped += 1
+                continue
+            
+            to_scrape.append(inmate)
+        
+        conn.close()
+        return to_scrape, skipped
+    
+    async def iter_inmate_pages(self, session, days_back=2, date_range=None, max_attempts=3):
+        """Page through every search results page, yielding each page's inmates
+        
+        If the search fails partway it is retried from the start with backoff, and
+        the pages that were already yielded are skipped.
+        """
+        # Get date range, unless an explicit (from, to) window was given
+        from_date, to_date = date_range or self.get_date_range(days_back)
+        
+        current_page = 0
+        found = 0
+        
+        for attempt in range(1, max_attempts + 1):
+            pages_seen = 0
+            page_started = time.monotonic()
             try:
-                # Check for "no results" message or empty table
-                no_results = await page.query_selector_all('.Results:has-text("No records found")')
-                if no_results:
-                    logger.info("No records found for the specified date range")
-                    break
-                
-                # Get all inmate rows
-                rows = await page.query_selector_all('tbody tr')
-                
-                if not rows:
-                    logger.info("No inmate rows found on this page")
-                    break
-                
-            except Exception as e:
-                logger.error(f"Error checking for results: {e}")
-                break
-                
-            for row in rows:
-                try:
-                    # Extract basic info from the list
-                    name_cell = await row.query_selector('td.Name a')
-                    subject_num_cell = await row.query_selector('td.SubjectNumber')
-                    race_cell = await row.query_selector('td.Race')
-                    gender_cell = await row.query_selector('td.Gender')
-                    dob_cell = await row.query_selector('td.DateOfBirth')
-                    height_cell = await row.query_selector('td.Height')
-                    weight_cell = await row.query_selector('td.Weight')
+                async for rows in session.search(self.base_url, from_date, to_date):
+                    # The first page includes loading and submitting the search form
+                    elapsed = time.monotonic() - page_started
+                    self.metrics.add_time('search_submit' if pages_seen == 0 else 'list_paging', elapsed)
+                    pages_seen += 1
+                    if pages_seen <= current_page:
+                        page_started = time.monotonic()
+                        continue
+                    current_page += 1
+                    self.metrics.observe('list_page_seconds', elapsed)
+                    self.metrics.inc('list_pages')
+                    logger.info(f"Scraping page {current_page}")
                     
-                    if name_cell:
-                        name = await name_cell.inner_text()
-                        detail_link = await name_cell.get_attribute('href')
-                        subject_number = await subject_num_cell.inner_text() if subject_num_cell else ""
-                        race = await race_cell.inner_text() if race_cell else ""
-                        gender = await gender_cell.inner_text() if gender_cell else ""
-                        dob = await dob_cell.inner_text() if dob_cell else ""
-                        height = await height_cell.inner_text() if height_cell else ""
-                        weight = await weight_cell.inner_text() if weight_cell else ""
-                        
-                        # Parse name
-                        last_name, first_name, middle_name, suffix = self.parse_name(name)
-                        
-                        inmate_data = {
-                            'name': name,
-                            'detail_link': detail_link,
-                            'subject_number': subject_number,
-                            'last_name': last_name,
-                            'first_name': first_name,
-                            'middle_name': middle_name,
-                            'suffix': suffix,
-                            'race': race,
-                            'gender': gender,
-                            'dob': dob,
-                            'height': height,
-                            'weight': weight
-                        }
-                        
-                        inmates_data.append(inmate_data)
+                    if not rows:
+                        logger.info("No inmate rows found on this page")
+                        break
+                    
+                    inmates_data = []
+                    for row in rows:
+                        try:
+                            # Parse name
+                            last_name, first_name, middle_name, suffix = self.parse_name(row['name'])
+                            
+                            inmate_data = {
+                                'name': row['name'],
+                                'detail_link': row['detail_link'],
+                                'subject_number': row['subject_number'],
+                                'last_name': last_name,
+                                'first_name': first_name,
+                                'middle_name': middle_name,
+                                'suffix': suffix,
+                                'race': row['race'],
+                                'gender': row['gender'],
+                                'dob': row['dob'],
+                                'height': row['height'],
+                                'weight': row['weight']
+                            }
+                            
+                            inmates_data.append(inmate_data)
                         
-                except Exception as e:
-                    logger.error(f"Error processing row: {e}")
-                    continue
-            
-            # Check if there's a next page and we haven't reached the limit
-            if current_page < max_pages:
-                next_link = await page.query_selector('a.Next[href]')
-                if next_link:
-                    logger.info("Moving to next page")
-                    await next_link.click()
-                    await page.wait_for_selector('.Results')
-                    current_page += 1
-                else:
-                    logger.info("No more pages found")
-                    break
-            else:
-                logger.info(f"Reached maximum page limit of {max_pages}")
+                        except Exception as e:
+                            logger.error(f"Error processing row: {e}")
+                            continue
+                    
+                    found += len(inmates_data)
+                    self.metrics.inc('list_rows', len(inmates_data))
+                    yield inmates_data
+                    page_started = time.monotonic()
                 break
+            except Exception as e:
+                if attempt == max_attempts:
+                    logger.error(f"Error reading search results, giving up after {attempt} attempts: {e}")
+                    break
+                delay = backoff_delay(attempt)
+                self.metrics.inc('search_retries')
+                logger.warning(f"Error reading search results on page {current_page + 1}: {e}; "
+                               f"retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
         
-        logger.info(f"Found {len(inmates_data)} inmates total from {current_page} pages")
-        return inmates_data
+        logger.info(f"Found {found} inmates total from {current_page} pages")
     
-    async def scrape_inmate_details(self, page, inmate_data):
-        """Scrape individual inmate details"""
-        detail_url = f"https://nwwebcad.fcpsn.org{inmate_data['detail_link']}"
+    async def scrape_inmate_details(self, session, inmate_data):
+        """Scrape individual inmate details, raising if the page cannot be loaded"""
+        detail_url = urljoin(self.base_url, inmate_data['detail_link'])
         logger.info(f"Scraping details for {inmate_data['name']}")
         
-        try:
-            await page.goto(detail_url)
-            await page.wait_for_selector('#Inmate_Detail')
+        # Scrape demographics, booking history and charges in one pass
+        page_data = await session.fetch_detail(detail_url)
+        
+        # Combine all data
+        complete_data = {
+            **inmate_data,
+            'demographics': page_data['demographics'],
+            'bookings': page_data['bookings']
+        }
+        
+        return complete_data
+    
+    def booking_rows(self, inmate):
+        """Flatten the booking history into bookings-table rows, each with its charges"""
+        bookings = []
+        for booking in inmate.get('bookings', []):
+            bookings.append({
+                'booking_num': booking.get('booking_number', ''),
+                'booking_date': booking.get('booking_date', ''),
+                'release_date': booking.get('release_date', ''),
+                'booking_at': to_iso_datetime(booking.get('booking_date', '')),
+                'released_at': to_iso_datetime(booking.get('release_date', '')),
+                'charges': [{column: charge.get(column, '') for column in CHARGE_COLUMNS}
+                            for charge in booking.get('charges', [])]
+            })
+        return bookings
+    
+    def inmate_row(self, inmate, bookings):
+        """Map a scraped inmate onto the inmates table columns"""
+        # Determine most recent booking info
+        booking_date, release_date, in_custody = self.booking_status(inmate)
+        
+        row = {
+            'booking_num': bookings[0]['booking_num'] if bookings else '',
+            'inmate_id': inmate.get('subject_number', ''),
+            'last_name': inmate.get('last_name', ''),
+            'first_name': inmate.get('first_name', ''),
+            'middle_name': inmate.get('middle_name', ''),
+            'suffix': inmate.get('suffix', ''),
+            'sex': inmate.get('gender', ''),
+            'race': inmate.get('race', ''),
+            'booking_date': booking_date,
+            'release_date': release_date,
+            'booking_at': to_iso_datetime(booking_date),
+            'released_at': to_iso_datetime(release_date),
+            'in_custody': in_custody,
+            'photo_link': '',  # not available in this system
+            'charge_count': sum(len(booking['charges']) for booking in bookings)
+        }
+        row['content_hash'] = fingerprint({**row, 'bookings': bookings})
+        return row
+    
+    def write_bookings(self, cursor, row_ids, bookings_by_num):
+        """Replace the bookings and charges belonging to the given inmates rows"""
+        ids = list(row_ids.values())
+        placeholders = ', '.join('?' for _ in ids)
+        cursor.execute(f'DELETE FROM charges WHERE inmate_row_id IN ({placeholders})', ids)
+        cursor.execute(f'DELETE FROM bookings WHERE inmate_row_id IN ({placeholders})', ids)
+        
+        for booking_num, row_id in row_ids.items():
+            charge_rows = []
+            for position, booking in enumerate(bookings_by_num[booking_num]):
+                cursor.execute('''
+                    INSERT INTO bookings
+                    (inmate_row_id, position, booking_num, booking_date, release_date, booking_at, released_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (row_id, position, booking['booking_num'], booking['booking_date'], booking['release_date'],
+                      booking['booking_at'], booking['released_at']))
+                booking_id = cursor.lastrowid
+                
+                for charge_position, charge in enumerate(booking['charges']):
+                    charge_rows.append((row_id, booking_id, charge_position,
+                                        *(charge[column] for column in CHARGE_COLUMNS)))
             
-            # Scrape demographic information
-            demographics = {}
-            demo_items = await page.query_selector_all('#DemographicInformation ul.FieldList li')
+            cursor.executemany(f'''
+                INSERT INTO charges (inmate_row_id, booking_id, position, {', '.join(CHARGE_COLUMNS)})
+                VALUES (?, ?, ?, {', '.join('?' for _ in CHARGE_COLUMNS)})
+            ''', charge_rows)
+    
+    def upsert_sql(self):
+        columns = INMATE_COLUMNS + ['content_hash']
+        return f'''
+            INSERT INTO inmates ({', '.join(columns)})
+            VALUES ({', '.join(':' + column for column in columns)})
+            ON CONFLICT(booking_num) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in columns if column != 'booking_num')}
+            WHERE inmates.content_hash IS NOT excluded.content_hash
+        '''
+    
+    def save_batch(self, cursor, chunk, counts):
+        """Upsert one batch of scraped inmates in a single transaction, updating counts"""
+        # Later records win on duplicate booking numbers, as with sequential writes
+        rows = {}
+        bookings_by_num = {}
+        states = {}
+        subjects = {}
+        detail_links = []
+        for inmate in chunk:
+            try:
+                bookings = self.booking_rows(inmate)
+                row = self.inmate_row(inmate, bookings)
+            except Exception as e:
+                counts['errors'] += 1
+                logger.error(f"Error saving {inmate.get('name', 'Unknown')}: {e}")
+                continue
             
-            for item in demo_items:
-                label_elem = await item.query_selector('label')
-                span_elem = await item.query_selector('span')
-                
-                if label_elem and span_elem:
-                    label = await label_elem.inner_text()
-                    value = await span_elem.inner_text()
-                    demographics[label.lower().replace(' ', '_')] = value
+            rows[row['booking_num']] = row
+            bookings_by_num[row['booking_num']] = bookings
+            if inmate.get('detail_link'):
+                detail_links.append((inmate['detail_link'],))
+            if inmate.get('subject_number'):
+                subjects[row['booking_num']] = inmate['subject_number']
+                states[inmate['subject_number']] = (
+                    inmate['subject_number'],
+                    inmate.get('name', ''),
+                    self.list_fingerprint(inmate),
+                    fingerprint({'demographics': inmate.get('demographics', {}),
+                                 'bookings': inmate.get('bookings', [])}),
+                    row['in_custody'],
+                    datetime.now().isoformat(timespec='seconds'),
+                    row['booking_at']
+                )
+        
+        if not rows:
+            return
+        
+        wal_before = self.wal_position()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
             
-            # Scrape booking history
-            bookings = []
-            booking_sections = await page.query_selector_all('#BookingHistory .Booking')
+            placeholders = ', '.join('?' for _ in rows)
+            cursor.execute(f'SELECT booking_num, content_hash FROM inmates WHERE booking_num IN ({placeholders})',
+                           list(rows))
+            existing = dict(cursor.fetchall())
             
-            for booking_section in booking_sections:
-                booking_data = {}
-                
-                # Get booking number
-                booking_header = await booking_section.query_selector('h3 span')
-                if booking_header:
-                    booking_data['booking_number'] = await booking_header.inner_text()
-                
-                # Get booking details
-                booking_items = await booking_section.query_selector_all('ul.FieldList li')
-                for item in booking_items:
-                    label_elem = await item.query_selector('label')
-                    span_elem = await item.query_selector('span')
-                    
-                    if label_elem and span_elem:
-                        label = await label_elem.inner_text()
-                        value = await span_elem.inner_text()
-                        booking_data[label.lower().replace(' ', '_')] = value
-                
-                # Scrape charges for this booking
-                charges = []
-                charge_rows = await booking_section.query_selector_all('.BookingCharges tbody tr')
-                
-                for row in charge_rows:
-                    charge = {}
-                    cells = await row.query_selector_all('td')
-                    
-                    if len(cells) >= 13:
-                        charge['seq_number'] = await cells[0].inner_text()
-                        charge['charge_description'] = await cells[1].inner_text()
-                        charge['counts'] = await cells[2].inner_text()
-                        charge['offense_date'] = await cells[3].inner_text()
-                        charge['docket_number'] = await cells[4].inner_text()
-                        charge['sentence_date'] = await cells[5].inner_text()
-                        charge['disposition'] = await cells[6].inner_text()
-                        charge['disposition_date'] = await cells[7].inner_text()
-                        charge['sentence_length'] = await cells[8].inner_text()
-                        charge['crime_class'] = await cells[9].inner_text()
-                        charge['arresting_agencies'] = await cells[10].inner_text()
-                        charge['attempt_commit'] = await cells[11].inner_text()
-                        charge['charge_bond'] = await cells[12].inner_text()
-                        
-                        charges.append(charge)
-                
-                booking_data['charges'] = charges
-                bookings.append(booking_data)
+            changed = []
+            for booking_num, row in rows.items():
+                if booking_num not in existing:
+                    counts['inserted'] += 1
+                    changed.append(row)
+                elif existing[booking_num] != row['content_hash']:
+                    counts['updated'] += 1
+                    changed.append(row)
+                else:
+                    counts['unchanged'] += 1
             
-            # Combine all data
-            complete_data = {
-                **inmate_data,
-                'demographics': demographics,
-                'bookings': bookings
-            }
+            cursor.executemany(self.upsert_sql(), changed)
             
-            return complete_data
+            if changed:
+                changed_nums = [row['booking_num'] for row in changed]
+                cursor.execute(f'''
+                    SELECT booking_num, id FROM inmates
+                    WHERE booking_num IN ({', '.join('?' for _ in changed_nums)})
+                ''', changed_nums)
+                row_ids = dict(cursor.fetchall())
+                self.write_bookings(cursor, row_ids, bookings_by_num)
+            cursor.executemany(f'''
+                INSERT OR REPLACE INTO scrape_state ({', '.join(STATE_COLUMNS)})
+                VALUES ({', '.join('?' for _ in STATE_COLUMNS)})
+            ''', list(states.values()))
+            cursor.executemany('DELETE FROM retry_queue WHERE detail_link = ?', detail_links)
             
-        except Exception as e:
-            logger.error(f"Error scraping details for {inmate_data['name']}: {e}")
+            cursor.execute('COMMIT')
+        except sqlite3.Error as e:
+            cursor.execute('ROLLBACK')
+            counts['errors'] += len(rows)
+            logger.error(f"Error saving batch of {len(rows)} inmates: {e}")
+            return
+        
+        self.count_wal_writes(wal_before, self.wal_position())
+        
+        if self.changes is not None and changed:
+            self.changes.record(self.change_records(changed, row_ids, bookings_by_num, subjects, states))
+    
+    def wal_position(self):
+        """(salt, frames, page size) of the WAL, read from the wal-index header, or None outside WAL mode"""
+        try:
+            with open(f"{self.db_path}-shm", 'rb') as f:
+                header = f.read(WAL_INDEX_HEADER.size)
+        except OSError:
+            return None
+        if len(header) < WAL_INDEX_HEADER.size:
             return None
+        page_size, frames, salt = WAL_INDEX_HEADER.unpack(header)
+        return salt, frames, 65536 if page_size == 1 else page_size
     
-    def save_to_database(self, inmates_data):
-        """Save scraped data to database"""
-        conn = sqlite3.connect(self.db_path)
+    def count_wal_writes(self, before, after):
+        """Add the pages a transaction appended to the WAL to db_bytes_written
+        
+        Checkpoints are left to SQLite; if the WAL restarted from the beginning
+        during the transaction (new salt), every frame in it is the transaction's.
+        """
+        if before is None or after is None:
+            return
+        salt, frames, page_size = after
+        written = frames if salt != before[0] else frames - before[1]
+        self.metrics.inc('db_bytes_written', written * page_size)
+    
+    def change_records(self, changed, row_ids, bookings_by_num, subjects, states):
+        """Delta records for the rows a batch inserted or updated, with their scrape state"""
+        records = []
+        for row in changed:
+            records.append({
+                'inmate': {'id': row_ids[row['booking_num']], **row},
+                'bookings': bookings_by_num[row['booking_num']]
+            })
+            state = states.get(subjects.get(row['booking_num']))
+            if state:
+                records.append({'state': dict(zip(STATE_COLUMNS, state))})
+        return records
+    
+    def record_run(self, cursor, counts, failures=None, worker_stats=None):
+        """Fold the run's totals into its metrics and store the report in scrape_runs"""
+        for key, value in counts.items():
+            self.metrics.inc(key, value)
+        self.metrics.inc('failures', len(failures or []))
+        for stats in worker_stats or []:
+            self.metrics.add_time('detail_fetch', stats['busy_seconds'])
+            self.metrics.add_time('rate_limit_wait', stats['wait_seconds'])
+            self.metrics.add_time('dom_extraction', stats['extract_seconds'])
+            self.metrics.inc('detail_requests', stats['pages'])
+            self.metrics.inc('detail_retries', stats['retries'])
+            self.metrics.inc('bytes_downloaded', stats['bytes'])
+            self.metrics.inc('assets_blocked', stats['blocked'])
+            self.metrics.inc('assets_cached', stats['cached'])
+        
+        self.metrics.finish()
+        report = self.metrics.report()
+        cursor.execute('''
+            INSERT INTO scrape_runs (started_at, finished_at, duration_seconds, backend, inserted, updated,
+                                     unchanged, errors, detail_requests, failures, report)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (report['started_at'], report['finished_at'], report['duration_seconds'], report.get('backend'),
+              counts['inserted'], counts['updated'], counts['unchanged'], counts['errors'],
+              report['counters'].get('detail_requests', 0), len(failures or []), json.dumps(report)))
+        return report
+    
+    def finish_saving(self, conn, counts, failures=None, worker_stats=None):
+        """Publish a new data generation if anything changed, record the run, checkpoint and report"""
         cursor = conn.cursor()
+        started = time.monotonic()
+        if counts['inserted'] or counts['updated']:
+            cursor.execute("UPDATE scrape_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'")
+            self.write_generation_stamp(cursor)
+        if self.changes is not None:
+            delta = self.changes.finish(self.generation(cursor))
+            self.changes = None
+            if delta:
+                self.metrics.inc('delta_bytes', delta[1])
         
-        for inmate in inmates_data:
-            try:
-                # Determine most recent booking info
-                booking_date = ""
-                release_date = ""
-                in_custody = "No"
-                
-                if inmate.get('bookings'):
-                    latest_booking = inmate['bookings'][0]  # Assuming first is most recent
-                    booking_date = latest_booking.get('booking_date', '')
-                    release_date = latest_booking.get('release_date', '')
-                    in_custody = "Yes" if not release_date else "No"
-                
-                # Prepare charges as JSON
-                all_charges = []
-                for booking in inmate.get('bookings', []):
-                    all_charges.extend(booking.get('charges', []))
-                
-                charges_json = json.dumps(all_charges)
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO inmates 
-                    (booking_num, inmate_id, last_name, first_name, middle_name, suffix,
-                     sex, race, booking_date, release_date, in_custody, photo_link, charges)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    inmate.get('bookings', [{}])[0].get('booking_number', '') if inmate.get('bookings') else '',
-                    inmate.get('subject_number', ''),
-                    inmate.get('last_name', ''),
-                    inmate.get('first_name', ''),
-                    inmate.get('middle_name', ''),
-                    inmate.get('suffix', ''),
-                    inmate.get('gender', ''),
-                    inmate.get('race', ''),
-                    booking_date,
-                    release_date,
-                    in_custody,
-                    '',  # photo_link - not available in this system
-                    charges_json
-                ))
-                
-            except Exception as e:
-                logger.error(f"Error saving {inmate.get('name', 'Unknown')}: {e}")
-                continue
+        self.metrics.add_time('db_finish', time.monotonic() - started)
+        report = self.record_run(cursor, counts, failures, worker_stats)
         
-        conn.commit()
+        # Fold the WAL back into the main file so the committed database is self-contained
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+        logger.info(
+            f"Saved {counts['inserted'] + counts['updated']} inmates to database: {counts['inserted']} inserted, "
+            f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['errors']} errors"
+        )
+        
+        for inmate in failures or []:
+            logger.warning(f"Details not saved for {inmate.get('name', 'Unknown')} ({inmate.get('subject_number', '')})")
+        
+        for stats in worker_stats or []:
+            pages = max(stats['pages'], 1)
+            logger.info(
+                f"Worker {stats['worker']}: {stats['pages']} pages, {stats['retries']} retries, "
+                f"{stats['failures']} failures, {stats['busy_seconds']:.1f}s scraping, "
+                f"{stats['wait_seconds']:.1f}s rate-limited, "
+                f"{stats['bytes'] / pages / 1024:.1f} KB and {stats['busy_seconds'] / pages:.2f}s per page"
+            )
+        
+        if worker_stats and any(stats['blocked'] or stats['cached'] for stats in worker_stats):
+            logger.info(
+                f"Assets: {sum(stats['blocked'] for stats in worker_stats)} requests blocked, "
+                f"{sum(stats['cached'] for stats in worker_stats)} served from cache "
+                f"({sum(stats['cached_bytes'] for stats in worker_stats) / 1024:.0f} KB not downloaded)"
+            )
+        
+        logger.info("Phase timings: " + ', '.join(f"{name} {seconds:.2f}s" for name, seconds in report['phases'].items()))
+        return report
+    
+    def save_to_database(self, inmates_data, failures=None, worker_stats=None, batch_size=500):
+        """Save scraped data to database in batched transactions
+        
+        Rows are upserted on booking_num so their ids (and /inmate/<id> URLs) stay
+        stable, and rows whose content hash is unchanged are not rewritten.
+        Returns counts of rows inserted, updated and unchanged.
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        for start in range(0, len(inmates_data), batch_size):
+            self.save_batch(cursor, inmates_data[start:start + batch_size], counts)
+        
+        self.finish_saving(conn, counts, failures, worker_stats)
+        return counts
+    
+    def load_retry_queue(self, max_runs=MAX_RETRY_RUNS):
+        """List-row data for detail pages that failed on earlier runs"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT inmate FROM retry_queue WHERE runs_failed < ? ORDER BY last_failed', (max_runs,))
+        inmates = [json.loads(inmate) for inmate, in cursor.fetchall()]
+        cursor.execute('SELECT COUNT(*) FROM retry_queue WHERE runs_failed >= ?', (max_runs,))
+        abandoned = cursor.fetchone()[0]
         conn.close()
-        logger.info(f"Saved {len(inmates_data)} inmates to database")
+        
+        if abandoned:
+            logger.warning(f"{abandoned} detail pages have failed {max_runs} runs in a row and are no longer retried")
+        return inmates
     
-    async def run(self, max_inmates=None, days_back=2):
-        """Main scraping function"""
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
-            
-            try:
-                # Get list of all inmates
-                inmates_list = await self.scrape_inmate_list(page)
-                
-                if not inmates_list:
-                    logger.warning("No inmates found for the specified date range")
+    def save_retry_queue(self, cursor, failures):
+        """Remember detail pages that failed every attempt so the next run tries them first"""
+        now = datetime.now().isoformat(timespec='seconds')
+        cursor.executemany('''
+            INSERT INTO retry_queue (detail_link, inmate, runs_failed, last_error, last_failed)
+            VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT(detail_link) DO UPDATE SET
+                inmate = excluded.inmate,
+                runs_failed = retry_queue.runs_failed + 1,
+                last_error = excluded.last_error,
+                last_failed = excluded.last_failed
+        ''', [
+            (inmate['detail_link'],
+             json.dumps({key: value for key, value in inmate.items() if key != 'error'}),
+             inmate.get('error', ''), now)
+            for inmate in failures if inmate.get('detail_link')
+        ])
+        if failures:
+            logger.info(f"Queued {len(failures)} failed detail pages for the next run")
+    
+    async def enqueue(self, queue, inmate, list_stats, max_inmates=None):
+        """Hand an inmate to the detail workers; False once max_inmates have been queued"""
+        if max_inmates and list_stats['queued'] >= max_inmates:
+            logger.info(f"Reached --max-inmates limit of {max_inmates}")
+            return False
+        # Blocks while the detail workers are behind, so memory stays flat
+        await queue.put((list_stats['queued'], inmate))
+        list_stats['queued'] += 1
+        return True
+    
+    async def list_producer(self, backend, queue, worker_count, days_back=2, max_inmates=None,
+                            incremental=True, list_stats=None, date_range=None, retry_failed=True):
+        """Feed retried and newly listed inmates into the bounded detail queue as each page arrives"""
+        list_stats = list_stats if list_stats is not None else {}
+        list_stats.update(queued=0, skipped=0, retried=0)
+        retry_links = set()
+        session = await backend.open_session()
+        
+        try:
+            # Pages that failed on earlier runs go first, whatever their incremental state
+            for inmate in (self.load_retry_queue() if retry_failed else []):
+                retry_links.add(inmate['detail_link'])
+                if not await self.enqueue(queue, inmate, list_stats, max_inmates):
                     return
+                list_stats['retried'] += 1
+            
+            date_range = date_range or self.get_date_range(days_back)
+            async for inmates in self.iter_inmate_pages(session, days_back, date_range):
+                inmates = [inmate for inmate in inmates if inmate['detail_link'] not in retry_links]
+                if incremental:
+                    inmates, skipped = self.filter_unchanged(inmates, date_range)
+                    list_stats['skipped'] += skipped
                 
-                if max_inmates:
-                    inmates_list = inmates_list[:max_inmates]
+                for inmate in inmates:
+                    if not await self.enqueue(queue, inmate, list_stats, max_inmates):
+                        return
+        finally:
+            await session.close()
+            for _ in range(worker_count):
+                await queue.put(None)
+            
+            self.metrics.inc('queued', list_stats['queued'])
+            self.metrics.inc('skipped_unchanged', list_stats['skipped'])
+            self.metrics.inc('retried_from_queue', list_stats['retried'])
+            if list_stats['retried']:
+                logger.info(f"Retried {list_stats['retried']} detail pages that failed on earlier runs")
+            if incremental:
+                logger.info(f"Incremental run: skipped {list_stats['skipped']} unchanged detail pages, "
+                            f"queued {list_stats['queued']}")
+    
+    async def detail_worker(self, worker_id, backend, queue, limiter, breaker, results, failures, max_attempts=3):
+        """Pull inmates off the shared queue and scrape their details in a private session
+        
+        Each page gets up to max_attempts tries with jittered exponential backoff, and
+        every outcome feeds the shared rate limiter and circuit breaker.
+        """
+        stats = {'worker': worker_id, 'pages': 0, 'retries': 0, 'failures': 0,
+                 'busy_seconds': 0.0, 'wait_seconds': 0.0}
+        session = await backend.open_session()
+        
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                index, inmate = item
+                logger.info(f"[worker {worker_id}] Processing inmate {index + 1}: {inmate['name']}")
                 
-                # Scrape details for each inmate
-                detailed_inmates = []
-                for i, inmate in enumerate(inmates_list):
-                    logger.info(f"Processing inmate {i+1}/{len(inmates_list)}: {inmate['name']}")
+                detailed_data = None
+                page_started = time.monotonic()
+                bytes_before = session.stats['bytes']
+                for attempt in range(1, max_attempts + 1):
+                    stats['wait_seconds'] += await breaker.wait()
+                    stats['wait_seconds'] += await limiter.acquire()
+                    
+                    started = time.monotonic()
+                    try:
+                        detailed_data = await self.scrape_inmate_details(session, inmate)
+                    except Exception as e:
+                        error = e
+                    latency = time.monotonic() - started
+                    stats['busy_seconds'] += latency
+                    stats['pages'] += 1
+                    self.metrics.observe('detail_page_seconds', latency)
                     
-                    detailed_data = await self.scrape_inmate_details(page, inmate)
                     if detailed_data:
-                        detailed_inmates.append(detailed_data)
+                        limiter.record_success(latency)
+                        breaker.record_success()
+                        break
                     
-                    # Small delay to be respectful
-                    await asyncio.sleep(1)
+                    limiter.record_failure()
+                    breaker.record_failure()
+                    if attempt < max_attempts:
+                        delay = backoff_delay(attempt)
+                        logger.warning(f"[worker {worker_id}] Attempt {attempt} for {inmate['name']} failed: "
+                                       f"{error}; retrying in {delay:.1f}s")
+                        stats['retries'] += 1
+                        stats['wait_seconds'] += delay
+                        await asyncio.sleep(delay)
                 
-                # Save to database
-                if detailed_inmates:
-                    self.save_to_database(detailed_inmates)
-                    logger.info("Scraping completed successfully")
+                if detailed_data:
+                    logger.debug(f"[worker {worker_id}] {inmate['name']}: "
+                                 f"{(session.stats['bytes'] - bytes_before) / 1024:.1f} KB in "
+                                 f"{time.monotonic() - page_started:.2f}s")
+                    await results.put((index, detailed_data))
                 else:
-                    logger.warning("No detailed inmate data was collected")
-                
-            except Exception as e:
-                logger.error(f"Scraping failed: {e}")
-            finally:
-                await browser.close()
+                    logger.error(f"Error scraping details for {inmate['name']} after {max_attempts} attempts: {error}")
+                    stats['failures'] += 1
+                    failures.append({**inmate, 'error': str(error)})
+        finally:
+            stats.update(bytes=session.stats['bytes'], blocked=session.stats['blocked'],
+                         cached=session.stats['cached'], cached_bytes=session.stats['cached_bytes'],
+                         extract_seconds=session.stats['extract_seconds'])
+            await session.close()
+        
+        return stats
+    
+    async def batch_writer(self, results, write_batch, batch_size=500):
+        """Hand scraped records to write_batch in fixed-size batches as they complete"""
+        batch = []
+        while True:
+            item = await results.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= batch_size):
+                # Keep list order within a batch so duplicate booking numbers resolve as in a sequential run
+                batch.sort(key=lambda entry: entry[0])
+                started = time.monotonic()
+                try:
+                    write_batch([data for _, data in batch])
+                except Exception as e:
+                    logger.error(f"Error writing batch of {len(batch)} inmates: {e}")
+                self.metrics.add_time('db_write', time.monotonic() - started)
+                self.metrics.observe('db_batch_seconds', time.monotonic() - started)
+                self.metrics.inc('db_batches')
+                batch = []
+            if item is None:
+                return
+    
+    async def scrape(self, backend, write_batch, max_inmates=None, days_back=2, concurrency=1, rate=1.0,
+                     incremental=True, batch_size=500, date_range=None, max_rate=None, max_attempts=3,
+                     retry_failed=True, target_latency=None):
+        """Stream the date window through list, detail and writer stages on a started backend
+        
+        Each completed batch of detail records is passed to write_batch, so progress
+        is kept even if the run dies partway. Returns (failures, worker_stats).
+        """
+        worker_count = max(1, concurrency)
+        queue = asyncio.Queue(maxsize=worker_count * 2)
+        results = asyncio.Queue(maxsize=batch_size)
+        limiter = RateLimiter(rate, max_rate=max_rate, target_latency=target_latency)
+        breaker = CircuitBreaker()
+        failures = []
+        list_stats = {}
+        
+        adapting = f" (adapting up to {limiter.max_rate})" if limiter.rate else ""
+        logger.info(f"Scraping detail pages with {worker_count} workers at {rate} requests/sec{adapting}, "
+                    f"writing batches of {batch_size}")
+        writer = asyncio.create_task(self.batch_writer(results, write_batch, batch_size))
+        try:
+            _, *worker_stats = await asyncio.gather(
+                self.list_producer(backend, queue, worker_count, days_back, max_inmates, incremental,
+                                   list_stats, date_range, retry_failed),
+                *[self.detail_worker(worker_id, backend, queue, limiter, breaker, results, failures, max_attempts)
+                  for worker_id in range(1, worker_count + 1)]
+            )
+        finally:
+            # Flush whatever the workers finished, even when a stage failed
+            await results.put(None)
+            await writer
+        
+        if not list_stats.get('queued'):
+            logger.info("Nothing new to scrape")
+        if breaker.trips:
+            logger.warning(f"Circuit breaker tripped {breaker.trips} times; final rate {limiter.rate:.2f} requests/sec")
+        return failures, worker_stats
+    
+    async def run(self, max_inmates=None, days_back=2, concurrency=1, rate=1.0, incremental=True,
+                  backend='playwright', record_dir=None, batch_size=500, max_rate=None, max_attempts=3,
+                  block_resources=True, asset_cache_dir=DEFAULT_ASSET_CACHE, profile_path=DEFAULT_PROFILE,
+                  report_path=None, prometheus_path=None, delta_dir=None, target_latency=None):
+        """Main scraping function"""
+        self.metrics = RunMetrics(backend=backend)
+        fetch_backend = create_backend(backend, concurrency=concurrency, record_dir=record_dir,
+                                       block_resources=block_resources, asset_cache_dir=asset_cache_dir,
+                                       profile_path=profile_path)
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        conn = self.connect()
+        cursor = conn.cursor()
+        failures, worker_stats = [], []
+        if delta_dir:
+            self.changes = DeltaWriter(delta_dir, self.generation(cursor))
+        
+        try:
+            with self.metrics.phase('backend_start'):
+                await fetch_backend.start()
+            failures, worker_stats = await self.scrape(
+                fetch_backend, lambda batch: self.save_batch(cursor, batch, counts),
+                max_inmates=max_inmates, days_back=days_back, concurrency=concurrency, rate=rate,
+                incremental=incremental, batch_size=batch_size, max_rate=max_rate, max_attempts=max_attempts,
+                target_latency=target_latency
+            )
+            
+            if sum(counts.values()):
+                logger.info("Scraping completed successfully")
+            elif failures:
+                logger.warning("No detailed inmate data was collected")
+        
+        except Exception as e:
+            logger.error(f"Scraping failed: {e}")
+        finally:
+            await fetch_backend.close()
+            self.save_retry_queue(cursor, failures)
+            self.finish_saving(conn, counts, failures, worker_stats)
+            self.metrics.write(report_path, prometheus_path)
 
 if __name__ == "__main__":
-    scraper = FlaglerInmateScraper()
-    asyncio.run(scraper.run(days_back=2))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape Flagler County inmate bookings")
+    parser.add_argument('--days-back', type=int, default=2, help="How many days of bookings to search")
+    parser.add_argument('--max-inmates', type=int, help="Only scrape details for the first N inmates")
+    parser.add_argument('--concurrency', type=int, default=1, help="Number of detail pages scraped in parallel")
+    parser.add_argument('--rate', type=float, default=1.0, help="Starting detail requests per second across all workers")
+    parser.add_argument('--max-rate', type=float, help="Ceiling the rate may climb to while the server is healthy "
+                                                       "(default: 4x --rate)")
+    parser.add_argument('--target-latency', type=float,
+                        help="Response time in seconds that counts as slow and halves the rate "
+                             "(default: 3x the median of recent responses)")
+    parser.add_argument('--max-attempts', type=int, default=3, help="Tries per page before it goes to the retry queue")
+    parser.add_argument('--full', action='store_true', help="Revisit every detail page, even unchanged released bookings")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='playwright',
+                        help="Fetch pages with headless Chromium or a plain HTTP client")
+    parser.add_argument('--base-url', default=BASE_URL, help="Inmate inquiry URL, e.g. a local fixture server")
+    parser.add_argument('--record', metavar='DIR', help="Save every fetched page as a replayable fixture (http backend)")
+    parser.add_argument('--keep-assets', action='store_true',
+                        help="Let the browser load images, media and fonts (playwright backend)")
+    parser.add_argument('--asset-cache', metavar='DIR', default=DEFAULT_ASSET_CACHE,
+                        help="On-disk cache for scripts and stylesheets; '' disables it (playwright backend)")
+    parser.add_argument('--profile', metavar='PATH', default=DEFAULT_PROFILE,
+                        help="Stored browser profile reused across runs; '' disables it (playwright backend)")
+    parser.add_argument('--report', metavar='PATH', help="Write the run's metrics report as JSON")
+    parser.add_argument('--prometheus', metavar='PATH', help="Write the run's metrics in Prometheus text format")
+    parser.add_argument('--batch-size', type=int, default=500, help="Scraped inmates written per database transaction")
+    parser.add_argument('--deltas', metavar='DIR',
+                        help="Also write the run's inserts and updates to DIR as a compressed delta file")
+    args = parser.parse_args()
+    
+    scraper = FlaglerInmateScraper(base_url=args.base_url)
+    asyncio.run(scraper.run(max_inmates=args.max_inmates, days_back=args.days_back,
+                            concurrency=args.concurrency, rate=args.rate, incremental=not args.full,
+                            backend=args.backend, record_dir=args.record, batch_size=args.batch_size,
+                            max_rate=args.max_rate, max_attempts=args.max_attempts,
+                            block_resources=not args.keep_assets, asset_cache_dir=args.asset_cache,
+                            profile_path=args.profile, report_path=args.report,
+                            prometheus_path=args.prometheus, delta_dir=args.deltas,
+                            target_latency=args.target_latency))
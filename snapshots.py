@@ -0,0 +1,254 @@
+"""Ship the database as a base snapshot plus small per-run deltas.
+
+Scraper runs started with --deltas write only what they inserted or updated
+(see deltas.py), so each run adds a few kilobytes to the repository and the
+deploy instead of a new copy of the whole database. Deltas are applied in
+generation order on top of the base snapshot:
+
+    # once: turn an existing database into the base snapshot
+    python snapshots.py snapshot --db volusia_inmates.db --output snapshots/base.ndjson.gz
+
+    # on the server after every deploy: patch the live database with new deltas
+    python snapshots.py apply --db volusia_inmates.db --deltas deltas --base snapshots/base.ndjson.gz
+
+    # now and then: fold the deltas into a new base snapshot and delete them
+    python snapshots.py compact --base snapshots/base.ndjson.gz --deltas deltas
+
+apply builds the database from the base snapshot when it is missing or empty,
+skips deltas it already has, and refuses to skip over a missing one. Each file
+is applied in a single transaction, and the generation stamp is rewritten, so
+the web app drops its cached pages.
+"""
+import argparse
+import logging
+import os
+import tempfile
+
+from deltas import ChangeFile, delta_files, make_header, read_delta, read_header
+from extraction import CHARGE_COLUMNS
+from scraper import INMATE_COLUMNS, STATE_COLUMNS, FlaglerInmateScraper
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_BATCH = 1000
+
+
+def apply_sql():
+    """Upsert that keeps the row id recorded in the delta"""
+    columns = ['id'] + INMATE_COLUMNS + ['content_hash']
+    return f'''
+        INSERT INTO inmates ({', '.join(columns)})
+        VALUES ({', '.join(':' + column for column in columns)})
+        ON CONFLICT(booking_num) DO UPDATE SET
+            {', '.join(f'{column} = excluded.{column}' for column in columns if column not in ('id', 'booking_num'))}
+    '''
+
+
+def write_inmates(scraper, cursor, records):
+    rows = [record['inmate'] for record in records]
+    cursor.executemany(apply_sql(), rows)
+    nums = [row['booking_num'] for row in rows]
+    cursor.execute(f"SELECT booking_num, id FROM inmates WHERE booking_num IN ({', '.join('?' for _ in nums)})", nums)
+    scraper.write_bookings(cursor, dict(cursor.fetchall()),
+                           {record['inmate']['booking_num']: record['bookings'] for record in records})
+
+
+def apply_file(scraper, cursor, path, batch_size=500):
+    """Apply one delta or snapshot file in a single transaction; returns the inmates written"""
+    records = read_delta(path)
+    header = next(records)
+    written = 0
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        if header['full']:
+            cursor.execute('SELECT COUNT(*) FROM inmates')
+            if cursor.fetchone()[0]:
+                raise ValueError(f"Snapshot {path} can only be applied to an empty database")
+
+        batch = []
+        for record in records:
+            if 'inmate' in record:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    write_inmates(scraper, cursor, batch)
+                    written += len(batch)
+                    batch = []
+            elif 'state' in record:
+                # Deltas from before scrape_state.booking_at leave it NULL, so those subjects get rescraped
+                cursor.execute(f'''
+                    INSERT OR REPLACE INTO scrape_state ({', '.join(STATE_COLUMNS)})
+                    VALUES ({', '.join(':' + column for column in STATE_COLUMNS)})
+                ''', {column: record['state'].get(column) for column in STATE_COLUMNS})
+        if batch:
+            write_inmates(scraper, cursor, batch)
+            written += len(batch)
+
+        cursor.execute("UPDATE scrape_meta SET value = ? WHERE key = 'generation'", (str(header['generation']),))
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    finally:
+        records.close()
+    return written
+
+
+def apply(db_path, delta_dir, base_path=None):
+    """Bring a database up to the newest delta; returns the generation it ends on"""
+    scraper = FlaglerInmateScraper(db_path=db_path)
+    conn = scraper.connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT COUNT(*) FROM inmates')
+        if not cursor.fetchone()[0] and base_path and os.path.exists(base_path):
+            logger.info(f"Building {db_path} from {base_path}")
+            written = apply_file(scraper, cursor, base_path)
+            logger.info(f"Loaded {written} inmates at generation {scraper.generation(cursor)}")
+
+        generation = scraper.generation(cursor)
+        for path in delta_files(delta_dir):
+            header = read_header(path)
+            if header['generation'] <= generation:
+                continue
+            if header['base_generation'] != generation:
+                raise ValueError(f"{path} applies on top of generation {header['base_generation']}, but {db_path} "
+                                 f"is at generation {generation}; rebuild it from the base snapshot")
+            written = apply_file(scraper, cursor, path)
+            generation = header['generation']
+            logger.info(f"Applied {os.path.basename(path)}: {written} inmates, now at generation {generation}")
+
+        scraper.write_generation_stamp(cursor)
+        cursor.execute('PRAGMA optimize')
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    return generation
+
+
+def inmate_records(cursor, batch_size=SNAPSHOT_BATCH):
+    """Every inmate with its bookings and charges, in delta record form, by id"""
+    last_id = 0
+    while True:
+        cursor.execute(f'''
+            SELECT id, {', '.join(INMATE_COLUMNS)}, content_hash FROM inmates
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (last_id, batch_size))
+        names = [column[0] for column in cursor.description]
+        rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join('?' for _ in ids)
+        charges = {}
+        cursor.execute(f'''
+            SELECT booking_id, {', '.join(CHARGE_COLUMNS)} FROM charges
+            WHERE inmate_row_id IN ({placeholders}) ORDER BY booking_id, position
+        ''', ids)
+        for booking_id, *values in cursor.fetchall():
+            charges.setdefault(booking_id, []).append(dict(zip(CHARGE_COLUMNS, values)))
+
+        bookings = {}
+        cursor.execute(f'''
+            SELECT id, inmate_row_id, booking_num, booking_date, release_date, booking_at, released_at FROM bookings
+            WHERE inmate_row_id IN ({placeholders}) ORDER BY inmate_row_id, position
+        ''', ids)
+        for booking_id, row_id, booking_num, booking_date, release_date, booking_at, released_at in cursor.fetchall():
+            bookings.setdefault(row_id, []).append({
+                'booking_num': booking_num,
+                'booking_date': booking_date,
+                'release_date': release_date,
+                'booking_at': booking_at,
+                'released_at': released_at,
+                'charges': charges.get(booking_id, [])
+            })
+
+        for row in rows:
+            yield {'inmate': row, 'bookings': bookings.get(row['id'], [])}
+
+
+def snapshot(db_path, output_path):
+    """Write every inmate and scrape state of a database as a full snapshot"""
+    scraper = FlaglerInmateScraper(db_path=db_path)
+    conn = scraper.connect()
+    cursor = conn.cursor()
+    try:
+        generation = scraper.generation(cursor)
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        snapshot_file = ChangeFile(output_path, make_header(generation, full=True))
+        try:
+            inmates = 0
+            for record in inmate_records(conn.cursor()):
+                snapshot_file.write(record)
+                inmates += 1
+            cursor.execute(f"SELECT {', '.join(STATE_COLUMNS)} FROM scrape_state ORDER BY subject_number")
+            for state in cursor.fetchall():
+                snapshot_file.write({'state': dict(zip(STATE_COLUMNS, state))})
+        except Exception:
+            snapshot_file.discard()
+            raise
+        size = snapshot_file.close()
+    finally:
+        conn.close()
+    logger.info(f"Wrote snapshot {output_path}: {inmates} inmates at generation {generation}, {size / 1024:.0f} KB")
+    return generation
+
+
+def compact(base_path, delta_dir, db_path=None):
+    """Rebuild a database from the base snapshot and deltas, then make it the new base
+
+    The deltas folded into the new snapshot are deleted. With db_path the
+    rebuilt database is kept at that (new) path as well.
+    """
+    if db_path and os.path.exists(db_path):
+        raise ValueError(f"{db_path} already exists; compact only writes new databases")
+
+    work_dir = tempfile.mkdtemp(prefix='compact-', dir=os.path.dirname(os.path.abspath(db_path or base_path)))
+    rebuilt = os.path.join(work_dir, 'rebuilt.db')
+    try:
+        generation = apply(rebuilt, delta_dir, base_path)
+        snapshot(rebuilt, base_path)
+
+        folded = [path for path in delta_files(delta_dir) if read_header(path)['generation'] <= generation]
+        for path in folded:
+            os.remove(path)
+        logger.info(f"Compacted {len(folded)} deltas into {base_path} at generation {generation}")
+
+        if db_path:
+            os.replace(rebuilt, db_path)
+            os.replace(f"{rebuilt}.generation", f"{db_path}.generation")
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+    return generation
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Base snapshots and deltas of the inmate database")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    snapshot_parser = commands.add_parser('snapshot', help="Write a database out as a full snapshot")
+    snapshot_parser.add_argument('--db', default="volusia_inmates.db", help="Database to snapshot")
+    snapshot_parser.add_argument('--output', default="snapshots/base.ndjson.gz", help="Snapshot file to write")
+
+    apply_parser = commands.add_parser('apply', help="Patch a database with every delta it does not have yet")
+    apply_parser.add_argument('--db', default="volusia_inmates.db", help="Database to update")
+    apply_parser.add_argument('--deltas', default="deltas", help="Directory of delta files")
+    apply_parser.add_argument('--base', default="snapshots/base.ndjson.gz",
+                              help="Snapshot to start from when the database is missing or empty")
+
+    compact_parser = commands.add_parser('compact', help="Fold the deltas into a new base snapshot")
+    compact_parser.add_argument('--base', default="snapshots/base.ndjson.gz", help="Base snapshot to rewrite")
+    compact_parser.add_argument('--deltas', default="deltas", help="Directory of delta files")
+    compact_parser.add_argument('--db', help="Also keep the rebuilt database at this path")
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        snapshot(args.db, args.output)
+    elif args.command == 'apply':
+        apply(args.db, args.deltas, args.base)
+    else:
+        compact(args.base, args.deltas, args.db)
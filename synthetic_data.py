@@ -0,0 +1,217 @@
+"""Generate realistic synthetic inmate data for benchmarks.
+
+Records have the same shape the scraper produces (list-row fields plus
+demographics and a booking history with charges), so they go through the
+normal write path and produce a database laid out exactly like a scraped one.
+The same records can be rendered as NewWorld detail and results pages for
+parser benchmarks.
+
+    python synthetic_data.py bench.db --inmates 100000 --seed 1
+"""
+import argparse
+import html
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+
+from extraction import CHARGE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Weighted roughly like a county jail population
+LAST_NAMES = [
+    'SMITH', 'JOHNSON', 'WILLIAMS', 'BROWN', 'JONES', 'GARCIA', 'MILLER', 'DAVIS', 'RODRIGUEZ',
+    'MARTINEZ', 'HERNANDEZ', 'LOPEZ', 'WILSON', 'ANDERSON', 'THOMAS', 'TAYLOR', 'MOORE', 'JACKSON',
+    'MARTIN', 'LEE', 'PEREZ', 'THOMPSON', 'WHITE', 'HARRIS', 'SANCHEZ', 'CLARK', 'RAMIREZ', 'LEWIS',
+    'ROBINSON', 'WALKER', 'YOUNG', 'ALLEN', 'KING', 'WRIGHT', 'SCOTT', 'TORRES', 'NGUYEN', 'HILL',
+    'FLORES', 'GREEN', 'ADAMS', 'NELSON', 'BAKER', 'HALL', 'RIVERA', 'CAMPBELL', 'MITCHELL', 'CARTER',
+    'ROBERTS', 'GOMEZ', 'PHILLIPS', 'EVANS', 'TURNER', 'DIAZ', 'PARKER', 'CRUZ', 'EDWARDS', 'COLLINS',
+    'REYES', 'STEWART', "O'NEAL", 'MORRIS', 'MORALES', 'MURPHY', 'COOK', 'ROGERS', 'GUTIERREZ', 'ORTIZ',
+    'MORGAN', 'COOPER', 'PETERSON', 'BAILEY', 'REED', 'KELLY', 'HOWARD', 'RAMOS', 'KIM', 'COX', 'WARD',
+    'RICHARDSON', 'WATSON', 'BROOKS', 'CHAVEZ', 'WOOD', 'JAMES', 'BENNETT', 'GRAY', 'MENDOZA', 'RUIZ',
+    'HUGHES', 'PRICE', 'ALVAREZ', 'CASTILLO', 'SANDERS', 'PATEL', 'MYERS', 'LONG', 'ROSS', 'FOSTER',
+    'SAINT-JEAN', 'MCDONALD', 'DE LA CRUZ', 'VAN BUREN',
+]
+FIRST_NAMES = [
+    'JAMES', 'ROBERT', 'JOHN', 'MICHAEL', 'DAVID', 'WILLIAM', 'RICHARD', 'JOSEPH', 'THOMAS', 'CHRISTOPHER',
+    'CHARLES', 'DANIEL', 'MATTHEW', 'ANTHONY', 'MARK', 'DONALD', 'STEVEN', 'ANDREW', 'PAUL', 'JOSHUA',
+    'KENNETH', 'KEVIN', 'BRIAN', 'TIMOTHY', 'RONALD', 'JASON', 'GEORGE', 'EDWARD', 'JEFFREY', 'RYAN',
+    'JACOB', 'NICHOLAS', 'GARY', 'ERIC', 'JONATHAN', 'STEPHEN', 'LARRY', 'JUSTIN', 'SCOTT', 'BRANDON',
+    'MARY', 'PATRICIA', 'JENNIFER', 'LINDA', 'ELIZABETH', 'BARBARA', 'SUSAN', 'JESSICA', 'KAREN', 'SARAH',
+    'LISA', 'NANCY', 'SANDRA', 'ASHLEY', 'EMILY', 'KIMBERLY', 'MELISSA', 'DONNA', 'AMANDA', 'STEPHANIE',
+    'JOSÉ', 'JUAN', 'LUIS', 'CARLOS', 'TYRONE', 'DESHAWN', 'MARQUIS', 'JAMAL', 'CODY', 'DUSTIN',
+]
+SUFFIXES = ['', '', '', '', '', '', '', '', '', '', '', '', 'JR', 'SR', 'II', 'III']
+# Spelled as the site lists them, which is what the race and gender filters on the index page match
+RACES = [('WHITE', 60), ('BLACK', 30), ('HISPANIC', 6), ('ASIAN', 2), ('UNKNOWN', 2)]
+SEXES = [('Male', 76), ('Female', 24)]
+CHARGES = [
+    ('BATTERY - DOMESTIC', 'M1'), ('DUI', 'M2'), ('POSSESSION OF CONTROLLED SUBSTANCE', 'F3'),
+    ('DRIVING WHILE LICENSE SUSPENDED', 'M2'), ('PETIT THEFT', 'M2'), ('GRAND THEFT', 'F3'),
+    ('VIOLATION OF PROBATION', 'F3'), ('RESISTING OFFICER WITHOUT VIOLENCE', 'M1'),
+    ('POSSESSION OF DRUG PARAPHERNALIA', 'M1'), ('BURGLARY OF A DWELLING', 'F2'),
+    ('AGGRAVATED ASSAULT WITH A DEADLY WEAPON', 'F3'), ('TRESPASS', 'M2'), ('FAILURE TO APPEAR', 'M1'),
+    ('FRAUD - USE OF CREDIT CARD', 'F3'), ('ROBBERY', 'F2'), ('DEALING IN STOLEN PROPERTY', 'F2'),
+    ('CRIMINAL MISCHIEF', 'M2'), ('DISORDERLY INTOXICATION', 'M2'), ('WRITTEN THREATS TO KILL', 'F2'),
+    ('TRAFFICKING IN METHAMPHETAMINE', 'F1'),
+]
+AGENCIES = ['FLAGLER COUNTY SHERIFF', 'BUNNELL PD', 'FLAGLER BEACH PD', 'FLORIDA HIGHWAY PATROL']
+DISPOSITIONS = ['', '', 'RELEASED ON BOND', 'TIME SERVED', 'SENTENCED', 'NOLLE PROSEQUI', 'ROR']
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def zipf_choice(rng, values, s=1.1):
+    """Pick from values with a long-tailed (Zipf-like) preference for the front of the list"""
+    weights = [1 / (rank + 1) ** s for rank in range(len(values))]
+    return rng.choices(values, weights)[0]
+
+
+def site_datetime(moment):
+    return moment.strftime('%m/%d/%Y %I:%M %p')
+
+
+def synthetic_inmates(count, seed=1, years=5, now=None):
+    """Yield `count` scraped-inmate dicts with unique booking numbers"""
+    rng = random.Random(seed)
+    now = now or datetime(2025, 1, 1)
+    span = years * 365 * 24 * 3600
+
+    for index in range(count):
+        last_name = zipf_choice(rng, LAST_NAMES)
+        first_name = zipf_choice(rng, FIRST_NAMES, s=0.8)
+        middle_name = rng.choice(FIRST_NAMES) if rng.random() < 0.6 else ''
+        suffix = rng.choice(SUFFIXES)
+        name = f"{last_name}, " + ' '.join(part for part in (first_name, middle_name, suffix) if part)
+
+        # Most people have one booking; some come back
+        bookings = []
+        booked = now - timedelta(seconds=rng.randrange(span))
+        for position in range(rng.choices([1, 2, 3, 4], [70, 20, 7, 3])[0]):
+            if position:
+                booked -= timedelta(days=rng.randrange(30, 700))
+            in_custody = position == 0 and (now - booked).days < 120 and rng.random() < 0.3
+            released = '' if in_custody else site_datetime(booked + timedelta(hours=rng.randrange(2, 24 * 60)))
+            charges = []
+            for seq in range(1, rng.choices([1, 2, 3, 4, 6], [45, 25, 15, 10, 5])[0] + 1):
+                description, crime_class = rng.choice(CHARGES)
+                charge = dict.fromkeys(CHARGE_COLUMNS, '')
+                charge.update({
+                    'seq_number': str(seq),
+                    'charge_description': description,
+                    'counts': str(rng.choices([1, 2, 3], [85, 10, 5])[0]),
+                    'offense_date': booked.strftime('%m/%d/%Y'),
+                    'docket_number': f"{booked.year % 100:02d}{rng.randrange(10 ** 6):06d}{crime_class[0]}AFL",
+                    'disposition': rng.choice(DISPOSITIONS),
+                    'crime_class': crime_class,
+                    'arresting_agencies': rng.choice(AGENCIES),
+                    'charge_bond': f"${rng.choice([0, 500, 1000, 2500, 5000, 10000, 50000]):,}.00",
+                })
+                charges.append(charge)
+            bookings.append({
+                'booking_number': f"{booked.year}{index:07d}{position}",
+                'booking_date': site_datetime(booked),
+                'release_date': released,
+                'charges': charges,
+            })
+
+        dob = now - timedelta(days=rng.randrange(18 * 365, 70 * 365))
+        yield {
+            'name': name,
+            'detail_link': f"/NewWorld.InmateInquiry/FL0180000/Inmate/Detail/{-(index + 1)}",
+            'subject_number': str(100000 + index),
+            'last_name': last_name,
+            'first_name': first_name,
+            'middle_name': middle_name,
+            'suffix': suffix,
+            'race': weighted(rng, RACES),
+            'gender': weighted(rng, SEXES),
+            'dob': dob.strftime('%m/%d/%Y'),
+            'height': f"{rng.randrange(5, 7)}' {rng.randrange(0, 12):02d}\"",
+            'weight': str(rng.randrange(110, 320)),
+            'demographics': {'eye_color': rng.choice(['BRO', 'BLU', 'GRN', 'HAZ']),
+                             'hair_color': rng.choice(['BLK', 'BRO', 'BLN', 'GRY'])},
+            'bookings': bookings,
+        }
+
+
+def render_detail_page(inmate):
+    """Render an inmate as a NewWorld detail page"""
+    esc = html.escape
+    demographics = ''.join(f"<li><label>{esc(key.replace('_', ' ').title())}</label><span>{esc(value)}</span></li>"
+                           for key, value in inmate['demographics'].items())
+    bookings = []
+    for booking in inmate['bookings']:
+        rows = ''.join('<tr>' + ''.join(f'<td>{esc(charge[column])}</td>' for column in CHARGE_COLUMNS) + '</tr>'
+                       for charge in booking['charges'])
+        bookings.append(
+            f'<div class="Booking"><h3>Booking # <span>{esc(booking["booking_number"])}</span></h3>'
+            f'<ul class="FieldList"><li><label>Booking Date</label><span>{esc(booking["booking_date"])}</span></li>'
+            f'<li><label>Release Date</label><span>{esc(booking["release_date"])}</span></li></ul>'
+            f'<div class="BookingCharges"><table><thead><tr><th>Charge</th></tr></thead>'
+            f'<tbody>{rows}</tbody></table></div></div>'
+        )
+    return (f'<html><head><title>{esc(inmate["name"])}</title></head><body><div id="Inmate_Detail">'
+            f'<div id="DemographicInformation"><ul class="FieldList">{demographics}</ul></div>'
+            f'<div id="BookingHistory">{"".join(bookings)}</div></div></body></html>')
+
+
+def render_results_page(inmates, has_next=True):
+    """Render a page of inmates as a NewWorld search results table"""
+    esc = html.escape
+    rows = ''.join(
+        f'<tr><td class="Name"><a href="{esc(inmate["detail_link"])}">{esc(inmate["name"])}</a></td>'
+        f'<td class="SubjectNumber">{esc(inmate["subject_number"])}</td><td class="Race">{esc(inmate["race"])}</td>'
+        f'<td class="Gender">{esc(inmate["gender"])}</td><td class="DateOfBirth">{esc(inmate["dob"])}</td>'
+        f'<td class="Height">{esc(inmate["height"])}</td><td class="Weight">{esc(inmate["weight"])}</td></tr>'
+        for inmate in inmates
+    )
+    next_link = '<a class="Next" href="?Page=2">Next</a>' if has_next else ''
+    return (f'<html><body><div class="Results"><table><tbody>{rows}</tbody></table>'
+            f'{next_link}</div></body></html>')
+
+
+def generate_database(db_path, count, seed=1, years=5, batch_size=5000):
+    """Build a database of `count` synthetic inmates through the scraper's write path"""
+    from run_metrics import RunMetrics
+    from scraper import FlaglerInmateScraper
+
+    for suffix in ('', '-wal', '-shm', '.generation'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    scraper = FlaglerInmateScraper(db_path=db_path)
+    scraper.metrics = RunMetrics(backend='synthetic')
+    conn = scraper.connect()
+    cursor = conn.cursor()
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+
+    batch = []
+    for inmate in synthetic_inmates(count, seed, years):
+        batch.append(inmate)
+        if len(batch) >= batch_size:
+            scraper.save_batch(cursor, batch, counts)
+            batch = []
+            logger.info(f"Generated {counts['inserted']:,} of {count:,} inmates")
+    if batch:
+        scraper.save_batch(cursor, batch, counts)
+
+    cursor.execute('ANALYZE')
+    scraper.finish_saving(conn, counts)
+    return counts
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Generate a synthetic inmate database")
+    parser.add_argument('db_path', help="Database file to (re)create")
+    parser.add_argument('--inmates', type=int, default=100000, help="Number of inmates to generate")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed; the same seed gives the same data")
+    parser.add_argument('--years', type=int, default=5, help="Spread booking dates over this many years")
+    args = parser.parse_args()
+
+    generate_database(args.db_path, args.inmates, args.seed, args.years)
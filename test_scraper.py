@@ -0,0 +1,160 @@
+"""Tests for page parsing, timestamp handling, the ISO timestamp migration, batched writes and deltas.
+
+    python -m pytest -q
+"""
+import json
+import sqlite3
+
+import pytest
+from selectolax.lexbor import LexborHTMLParser
+
+import snapshots
+from deltas import DeltaWriter, delta_files
+from extraction import CHARGE_COLUMNS, node_text, parse_detail_page, parse_list_rows
+from scraper import FlaglerInmateScraper, to_iso_datetime
+from synthetic_data import render_detail_page, render_results_page, synthetic_inmates
+
+LIST_KEYS = ['name', 'subject_number', 'race', 'gender', 'dob', 'height', 'weight', 'detail_link']
+
+
+@pytest.fixture
+def inmates():
+    return list(synthetic_inmates(25, seed=7))
+
+
+@pytest.fixture
+def scraper(tmp_path):
+    return FlaglerInmateScraper(db_path=str(tmp_path / 'inmates.db'))
+
+
+def new_counts():
+    return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+
+
+def table_rows(db_path, tables):
+    conn = sqlite3.connect(db_path)
+    rows = {table: conn.execute(f'SELECT * FROM {table} ORDER BY 1').fetchall() for table in tables}
+    conn.close()
+    return rows
+
+
+def test_parse_list_rows_matches_rendered_page(inmates):
+    rows = parse_list_rows(LexborHTMLParser(render_results_page(inmates)))
+    assert rows == [{key: inmate[key] for key in LIST_KEYS} for inmate in inmates]
+
+
+def test_parse_detail_page_matches_rendered_page(inmates):
+    for inmate in inmates:
+        page = parse_detail_page(LexborHTMLParser(render_detail_page(inmate)))
+        assert page['demographics'] == inmate['demographics']
+        assert [booking['booking_number'] for booking in page['bookings']] == \
+            [booking['booking_number'] for booking in inmate['bookings']]
+        for parsed, booking in zip(page['bookings'], inmate['bookings']):
+            assert parsed['booking_date'] == booking['booking_date']
+            assert parsed['release_date'] == booking['release_date']
+            assert parsed['charges'] == [{column: charge[column] for column in CHARGE_COLUMNS}
+                                         for charge in booking['charges']]
+
+
+def test_node_text_keeps_innertext_line_breaks():
+    tree = LexborHTMLParser('<table><tr><td> FLAGLER COUNTY  SHERIFF<br>\n  BUNNELL PD <div>NOTE</div></td></tr></table>')
+    assert node_text(tree.css_first('td')) == 'FLAGLER COUNTY SHERIFF\nBUNNELL PD\nNOTE'
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('01/05/2024 01:20 PM', '2024-01-05T13:20:00'),
+    ('01/05/2024 01:20:30 AM', '2024-01-05T01:20:30'),
+    ('12/31/2023 23:05', '2023-12-31T23:05:00'),
+    ('  01/05/2024   9:00 AM ', '2024-01-05T09:00:00'),
+    ('01/05/2024', '2024-01-05T00:00:00'),
+    ('', ''),
+    (None, ''),
+    ('not a date', ''),
+])
+def test_to_iso_datetime(value, expected):
+    assert to_iso_datetime(value) == expected
+
+
+def test_migration_backfills_iso_timestamps(tmp_path):
+    # A database as the scraper wrote it before bookings, charges and ISO timestamps existed
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE inmates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, booking_num TEXT UNIQUE, inmate_id TEXT, last_name TEXT,
+            first_name TEXT, middle_name TEXT, suffix TEXT, sex TEXT, race TEXT, booking_date TEXT,
+            release_date TEXT, in_custody TEXT, photo_link TEXT, charges TEXT
+        )
+    ''')
+    charges = [{'charge_description': 'PETIT THEFT', 'crime_class': 'M2'}]
+    conn.execute('''
+        INSERT INTO inmates (booking_num, last_name, first_name, booking_date, release_date, in_custody, charges)
+        VALUES ('2024000001', 'DOE', 'JANE', '01/05/2024 01:20 PM', '01/07/2024 09:00 AM', 'No', ?)
+    ''', (json.dumps(charges),))
+    conn.commit()
+    conn.close()
+
+    FlaglerInmateScraper(db_path=db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT booking_at, released_at, charges FROM inmates').fetchone() == \
+        ('2024-01-05T13:20:00', '2024-01-07T09:00:00', None)
+    assert conn.execute('SELECT booking_num, booking_at, released_at FROM bookings').fetchall() == \
+        [('2024000001', '2024-01-05T13:20:00', '2024-01-07T09:00:00')]
+    assert conn.execute('SELECT charge_description, crime_class FROM charges').fetchall() == [('PETIT THEFT', 'M2')]
+    conn.close()
+
+
+def test_save_batch_counts_inserted_updated_unchanged(scraper, inmates):
+    conn = scraper.connect()
+    cursor = conn.cursor()
+
+    counts = new_counts()
+    scraper.save_batch(cursor, inmates, counts)
+    assert counts == {'inserted': len(inmates), 'updated': 0, 'unchanged': 0, 'errors': 0}
+
+    counts = new_counts()
+    scraper.save_batch(cursor, inmates, counts)
+    assert counts == {'inserted': 0, 'updated': 0, 'unchanged': len(inmates), 'errors': 0}
+
+    ids = dict(cursor.execute('SELECT booking_num, id FROM inmates').fetchall())
+    inmates[0]['bookings'][0]['charges'][0]['disposition'] = 'SENTENCED TO 30 DAYS'
+    counts = new_counts()
+    scraper.save_batch(cursor, inmates, counts)
+    assert counts == {'inserted': 0, 'updated': 1, 'unchanged': len(inmates) - 1, 'errors': 0}
+
+    # Updates keep row ids stable
+    assert dict(cursor.execute('SELECT booking_num, id FROM inmates').fetchall()) == ids
+    booking_num = inmates[0]['bookings'][0]['booking_number']
+    assert cursor.execute('''
+        SELECT c.disposition FROM charges c JOIN inmates i ON i.id = c.inmate_row_id
+        WHERE i.booking_num = ? AND c.position = 0
+        ORDER BY c.booking_id LIMIT 1
+    ''', (booking_num,)).fetchone() == ('SENTENCED TO 30 DAYS',)
+    conn.close()
+
+
+def test_deltas_rebuild_the_scraped_database(scraper, inmates, tmp_path):
+    delta_dir = str(tmp_path / 'deltas')
+    for disposition in (None, 'SENTENCED TO 30 DAYS'):
+        if disposition:
+            inmates[0]['bookings'][0]['charges'][0]['disposition'] = disposition
+        conn = scraper.connect()
+        cursor = conn.cursor()
+        scraper.changes = DeltaWriter(delta_dir, scraper.generation(cursor))
+        counts = new_counts()
+        scraper.save_batch(cursor, inmates, counts)
+        scraper.finish_saving(conn, counts)
+    assert len(delta_files(delta_dir)) == 2
+
+    copy_path = str(tmp_path / 'copy.db')
+    generation = snapshots.apply(copy_path, delta_dir)
+    conn = scraper.connect()
+    assert generation == scraper.generation(conn.cursor())
+    conn.close()
+
+    # Same rows under the same ids, so /inmate/<id> URLs agree between the two databases
+    tables = ['inmates', 'bookings', 'charges', 'scrape_state']
+    original = table_rows(scraper.db_path, tables)
+    assert len(original['inmates']) == len(inmates)
+    assert table_rows(copy_path, tables) == original
@@ -0,0 +1,116 @@
+"""Politeness and failure handling for requests to the county server.
+
+The rate limiter adapts AIMD-style: every fast, successful response nudges the
+request rate up by a fixed step, and every error or slow response halves it, but
+never below half the configured rate. A response is slow when it takes longer
+than a fixed target latency, or by default several times the median of recent
+responses, so ordinary page loads on a slow backend do not count.
+The circuit breaker stops all workers for a cool-down period after a run of
+consecutive failures, and backoff_delay spaces out retries of a single page.
+"""
+import asyncio
+import logging
+import random
+import statistics
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Global request budget shared by all detail workers (requests per second)
+
+    A rate of 0 disables limiting and adaptation altogether. Without a
+    target_latency, responses slower than slow_factor times the median of the
+    last `window` responses count as slow, once min_samples have been seen.
+    """
+    def __init__(self, rate, max_rate=None, min_rate=None, increase=0.05, target_latency=None,
+                 slow_factor=3.0, window=50, min_samples=10):
+        self.rate = rate if rate and rate > 0 else 0.0
+        self.max_rate = max_rate or self.rate * 4
+        self.min_rate = min_rate or self.rate / 2
+        self.increase = increase
+        self.target_latency = target_latency
+        self.slow_factor = slow_factor
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.next_slot = 0.0
+
+    @property
+    def interval(self):
+        return 1.0 / self.rate if self.rate else 0.0
+
+    async def acquire(self):
+        """Wait for the next free request slot and return how long we waited"""
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def slow_threshold(self):
+        """Latency above which a response counts as slow, or None while still learning the baseline"""
+        if self.target_latency:
+            return self.target_latency
+        if len(self.latencies) < self.min_samples:
+            return None
+        return self.slow_factor * statistics.median(self.latencies)
+
+    def record_success(self, latency):
+        """Speed up additively after a fast response; back off if the server is slowing down"""
+        if not self.rate:
+            return
+        threshold = self.slow_threshold()
+        self.latencies.append(latency)
+        if threshold is not None and latency > threshold:
+            self.slow_down(f"slow response ({latency:.1f}s)")
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def record_failure(self):
+        if self.rate:
+            self.slow_down("request failed")
+
+    def slow_down(self, reason):
+        rate = max(self.min_rate, self.rate / 2)
+        if rate != self.rate:
+            logger.info(f"Lowering request rate to {rate:.2f}/sec: {reason}")
+        self.rate = rate
+
+
+class CircuitBreaker:
+    """Pause every worker after too many consecutive failures"""
+    def __init__(self, threshold=5, cooldown=60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+
+    async def wait(self):
+        """Block while the breaker is open and return how long we waited"""
+        delay = self.open_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            return delay
+        return 0.0
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.threshold and time.monotonic() >= self.open_until:
+            self.trips += 1
+            self.open_until = time.monotonic() + self.cooldown
+            # Half-open afterwards: one more failure trips it again straight away
+            self.consecutive_failures = self.threshold - 1
+            logger.warning(f"{self.threshold} consecutive failures; pausing requests for {self.cooldown:.0f}s")
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Exponential backoff with full jitter for the given (1-based) retry attempt"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))